@@ -0,0 +1,94 @@
+"""animation.py
+Slides canvas items to their new places, all of them from one timer
+Created: 17.10.26
+"""
+import time
+
+FRAME_MS = 16 # The time between frames, about 60 frames a second
+DURATION_MS = 150 # The time a card takes to reach its new place
+
+class Animator:
+    """Moves groups of canvas items a little at each frame. Every group in
+    flight is moved in the same frame, and frames are dropped rather than
+    queued when Tk falls behind, so a late frame jumps straight to where the
+    items should be by then"""
+
+    def __init__(self, window, canvas, frame_ms=FRAME_MS,
+                 duration_ms=DURATION_MS):
+        """Creates an animator for the items of a canvas"""
+        self.window = window
+        self.canvas = canvas
+        self.frame = frame_ms / 1000
+        self.duration = duration_ms / 1000
+        self.groups = [] # The [tags, shift, moved, start time] of each group
+        self.batch = {} # The groups added since the last frame, by shift
+        self.tick_id = None
+        self.next_frame = 0.0
+        self.frames = 0
+        self.dropped = 0
+
+    def add(self, tags, shift):
+        """Slides the items with some tags by an (x, y) distance. Items added
+        with the same distance before the next frame are moved as one group,
+        so a run of cards or a whole cascade costs one move call a frame"""
+        group = self.batch.get(shift)
+        if group is not None:
+            group[0] += "||" + tags
+            return
+        now = time.perf_counter()
+        group = [tags, shift, (0, 0), now]
+        self.batch[shift] = group
+        self.groups.append(group)
+        if self.tick_id is None:
+            self.next_frame = now + self.frame
+            self.tick_id = self.window.after(int(self.frame * 1000),
+                                             self.tick)
+
+    def step(self, group, progress):
+        """Moves a group to where it should be after a fraction of its
+        animation"""
+        tags, (x, y), (moved_x, moved_y), start = group
+        eased = 1 - (1 - progress) ** 2 # Slows down as it arrives
+        to_x = round(x * eased)
+        to_y = round(y * eased)
+        if (to_x, to_y) != (moved_x, moved_y):
+            self.canvas.move(tags, to_x - moved_x, to_y - moved_y)
+            group[2] = (to_x, to_y)
+
+    def tick(self):
+        """Draws one frame of every group in flight"""
+        self.tick_id = None
+        self.batch = {}
+        now = time.perf_counter()
+        self.frames += 1
+        late = now - self.next_frame
+        if late >= self.frame:
+            # The frames that were missed are skipped, not made up
+            self.dropped += int(late / self.frame)
+            self.next_frame = now
+        self.next_frame += self.frame
+
+        groups = []
+        for group in self.groups:
+            progress = min((now - group[3]) / self.duration, 1.0)
+            self.step(group, progress)
+            if progress < 1.0:
+                groups.append(group)
+        self.groups = groups
+        if len(groups) != 0:
+            delay = max(int((self.next_frame - now) * 1000), 1)
+            self.tick_id = self.window.after(delay, self.tick)
+
+    def finish(self):
+        """Moves every item straight to the end of its animation"""
+        if self.tick_id is not None:
+            self.window.after_cancel(self.tick_id)
+            self.tick_id = None
+        for group in self.groups:
+            self.step(group, 1.0)
+        self.groups = []
+        self.batch = {}
+
+    def is_running(self):
+        """Returns whether any items are still moving"""
+        return len(self.groups) != 0
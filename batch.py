@@ -0,0 +1,158 @@
+"""batch.py
+Solves a range of seeded deals on every core, saving the results
+Created: 17.10.26
+
+Usage: python batch.py START END [--output FILE] [--workers N]
+                                 [--nodes N] [--seconds S]
+"""
+import argparse
+import os
+import struct
+import time
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor,
+                                as_completed, wait)
+from itertools import islice
+
+from engine import Game
+from solver import (BUDGET_EXCEEDED, MAX_NODES, SOLVED, UNSOLVABLE, Solver)
+
+RESULTS_MAGIC = b"SOLV"
+RESULTS_VERSION = 4 # Changes with the way deals are numbered or solved
+HEADER = struct.Struct("<4sH")
+RECORD = struct.Struct("<QBHI") # Seed, outcome, moves and nodes
+OUTCOMES = (SOLVED, UNSOLVABLE, BUDGET_EXCEEDED) # Indexed by outcome code
+MAX_RECORD_NODES = 0xFFFFFFFF
+MAX_RECORD_MOVES = 0xFFFF
+MAX_SEED = 1 << 64 # Seeds below this fit in a record
+DEFAULT_OUTPUT = "results.bin"
+DEFAULT_SECONDS = 10.0
+CHUNK_SIZE = 16 # Seeds sent to a worker at once
+CHUNKS_PER_WORKER = 2 # Chunks waiting in the pool for each worker
+
+solver = None # The solver of each worker process
+
+def start_worker(max_nodes, max_seconds):
+    """Creates the solver of a worker process"""
+    global solver
+    solver = Solver(max_nodes, max_seconds)
+
+def seed_argument(text):
+    """Parses a seed from the command line, rejecting one too large to be
+    recorded"""
+    seed = int(text)
+    if not 0 <= seed <= MAX_SEED:
+        raise argparse.ArgumentTypeError("seeds must be from 0 to %d" %
+                                         MAX_SEED)
+    return seed
+
+def solve_seeds(seeds):
+    """Solves the deals of some seeds in a worker. Returns a list of records
+    of (seed, outcome code, moves, nodes)"""
+    records = []
+    for seed in seeds:
+        result = solver.solve(Game(seed=seed))
+        records.append((seed, OUTCOMES.index(result.status),
+                        min(len(result.moves), MAX_RECORD_MOVES),
+                        min(result.nodes, MAX_RECORD_NODES)))
+    return records
+
+def read_results(path):
+    """Yields the (seed, outcome, moves, nodes) records of a results file,
+    ignoring a record that was only partly written"""
+    with open(path, "rb") as results_file:
+        header = results_file.read(HEADER.size)
+        magic, version = HEADER.unpack(header)
+        if magic != RESULTS_MAGIC or version != RESULTS_VERSION:
+            raise ValueError("%s is not a version %d results file" %
+                             (path, RESULTS_VERSION))
+        while True:
+            data = results_file.read(RECORD.size)
+            if len(data) < RECORD.size:
+                return
+            seed, outcome, moves, nodes = RECORD.unpack(data)
+            yield (seed, OUTCOMES[outcome], moves, nodes)
+
+def open_results(path):
+    """Opens a results file for appending and returns it with the set of
+    seeds it already holds. A partly written last record is removed"""
+    done = set()
+    if os.path.exists(path) and os.path.getsize(path) >= HEADER.size:
+        records = 0 # A seed can be in the file more than once
+        for seed, outcome, moves, nodes in read_results(path):
+            done.add(seed)
+            records += 1
+        results_file = open(path, "r+b")
+        results_file.truncate(HEADER.size + records * RECORD.size)
+        results_file.seek(0, os.SEEK_END)
+    else:
+        results_file = open(path, "wb")
+        results_file.write(HEADER.pack(RESULTS_MAGIC, RESULTS_VERSION))
+    return results_file, done
+
+def map_chunks(pool, function, items, chunk_size, workers=None):
+    """Yields the result of a function on each chunk of an iterable of
+    items as it arrives. Only a few chunks wait in the pool for each worker,
+    so items are read as the workers need them"""
+    limit = (workers or os.cpu_count() or 1) * CHUNKS_PER_WORKER
+    items = iter(items)
+    pending = set()
+    while True:
+        chunk = list(islice(items, chunk_size))
+        if len(chunk) == 0:
+            break
+        if len(pending) >= limit:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                yield future.result()
+        pending.add(pool.submit(function, chunk))
+    for future in as_completed(pending):
+        yield future.result()
+
+def run(start, end, path, workers=None, max_nodes=MAX_NODES,
+        max_seconds=DEFAULT_SECONDS):
+    """Solves the seeds from start up to end that are not already in the
+    results file, appending each result as it arrives. Returns the number
+    of deals with each outcome"""
+    results_file, done = open_results(path)
+    seeds = (seed for seed in range(start, end) if seed not in done)
+    counts = dict((outcome, 0) for outcome in OUTCOMES)
+    solved = 0
+    start_time = time.perf_counter()
+    with results_file, ProcessPoolExecutor(workers, initializer=start_worker,
+                                           initargs=(max_nodes,
+                                                     max_seconds)) as pool:
+        for records in map_chunks(pool, solve_seeds, seeds, CHUNK_SIZE,
+                                  workers):
+            for record in records:
+                results_file.write(RECORD.pack(*record))
+                counts[OUTCOMES[record[1]]] += 1
+            solved += len(records)
+            # Everything written so far survives an interrupted run
+            results_file.flush()
+    seconds = time.perf_counter() - start_time
+    print("Solved %d deals in %.1fs (%.1f deals/s), %d already done" %
+          (solved, seconds, solved / seconds if seconds else 0.0,
+           len(done)))
+    return counts
+
+def main():
+    """Runs a batch from the command line"""
+    parser = argparse.ArgumentParser(description="Solves a range of deals")
+    parser.add_argument("start", type=seed_argument, help="the first seed")
+    parser.add_argument("end", type=seed_argument,
+                        help="the seed after the last")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes, one per core by default")
+    parser.add_argument("--nodes", type=int, default=MAX_NODES,
+                        help="the node budget for each deal")
+    parser.add_argument("--seconds", type=float, default=DEFAULT_SECONDS,
+                        help="the time budget for each deal")
+    args = parser.parse_args()
+    counts = run(args.start, args.end, args.output, args.workers,
+                 args.nodes, args.seconds)
+    for outcome in OUTCOMES:
+        print("%s: %d" % (outcome, counts[outcome]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,489 @@
+"""bench.py
+Times the rules engine and the boards with fixed seeds, saving the results
+as JSON
+Created: 17.10.26
+
+Usage: python bench.py [--output FILE] [--baseline FILE] [--only NAME]
+                       [--count N] [--tk] [--xvfb]
+
+The engine benchmarks need no display. The board benchmarks are only run
+with --tk, and --xvfb starts a virtual display for them. Each benchmark
+times a whole loop of operations at once, since an engine operation takes
+only a few microseconds, and repeats the loop. Comparing against a baseline
+prints the change in the median time of each benchmark, and exits with
+status 1 if any is slower than the threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from functools import lru_cache
+from random import Random
+
+from engine import (FLIP, NO_CARD, STATE_TOP_PILE, STATE_VIS_BOARD, Game,
+                    History)
+
+RESULTS_VERSION = 3
+BENCH_SEED = 1807 # Seeds the deals and the moves chosen in playouts
+DEFAULT_COUNT = 1000 # Operations in each loop of an engine benchmark
+DEFAULT_TK_COUNT = 50 # Operations in each loop of a board benchmark
+PLAYOUTS_PER_COUNT = 10 # A playout is timed for every ten operations
+REPEAT_COUNT = 5 # Loops timed by each benchmark
+PERCENTILES = (50, 90, 99)
+MAX_PLAYOUT_MOVES = 300
+WARMUP_COUNT = 20 # Operations run before each benchmark is timed
+REGRESSION_THRESHOLD = 0.1 # A slowdown beyond this fraction fails
+XVFB_DISPLAY = ":99"
+XVFB_TIMEOUT = 5.0
+
+# Kinds of sampled move
+SINGLE = "single"
+RUN = "run"
+DRAW = "draw"
+RESET = "reset"
+
+def timed(times, function, *args):
+    """Calls a function, adding the seconds it took to a list. Returns what
+    the function returns"""
+    start = time.perf_counter()
+    result = function(*args)
+    times.append(time.perf_counter() - start)
+    return result
+
+def repeat(sample, repeats=REPEAT_COUNT):
+    """Returns the times of several runs of a sample function, each of which
+    times a loop of operations. A run returns the seconds of each operation,
+    or the seconds per operation of the whole loop if the operations are
+    too quick to time one at a time"""
+    return [sample() for i in range(repeats)]
+
+def move_kind(game, move):
+    """Returns the kind of a legal move"""
+    card_id, state, position = move
+    if card_id == NO_CARD:
+        return DRAW if len(game.closed_deck_cards) != 0 else RESET
+    if game.get_position(card_id)[0] == STATE_VIS_BOARD:
+        return RUN
+    return SINGLE
+
+@lru_cache(maxsize=None)
+def sample_moves(kind, count):
+    """Returns count (seed, moves, index) samples of a kind of move, where
+    moves[index] is the move, made after the moves before it in a game dealt
+    from the seed. The games are random playouts, the same on every run. The
+    samples are shared, so they must not be changed"""
+    samples = []
+    seed = 0
+    while len(samples) < count:
+        rng = Random(BENCH_SEED + seed)
+        game = Game(seed=seed)
+        moves = []
+        for i in range(MAX_PLAYOUT_MOVES):
+            legal_moves = game.legal_moves()
+            if len(legal_moves) == 0:
+                break
+            move = rng.choice(legal_moves)
+            if move_kind(game, move) == kind and len(samples) < count:
+                samples.append((seed, moves, len(moves)))
+            moves.append(move)
+            game.apply(move)
+        seed += 1
+    return samples
+
+def sample_games(kind, count):
+    """Returns (game, move) pairs of sampled moves of a kind, each with its
+    own copy of the position"""
+    pairs = []
+    for seed, moves, index in sample_moves(kind, count):
+        history = History(Game(seed=seed))
+        for move in moves[:index]:
+            history.apply(move)
+        pairs.append((history.game, moves[index]))
+    return pairs
+
+def bench_engine_deal(count):
+    """Deals games from seeds"""
+    def sample():
+        start = time.perf_counter()
+        for seed in range(count):
+            Game(seed=seed)
+        return [(time.perf_counter() - start) / count]
+    return repeat(sample)
+
+def bench_engine_legal_moves(count):
+    """Lists the legal moves of positions from playouts"""
+    games = [game for game, move in sample_games(SINGLE, count)]
+    def sample():
+        start = time.perf_counter()
+        for game in games:
+            game.legal_moves()
+        return [(time.perf_counter() - start) / count]
+    return repeat(sample)
+
+def bench_engine_move(kind):
+    """Returns a benchmark that makes sampled moves of a kind, undoing them
+    after each loop"""
+    def bench(count):
+        pairs = sample_games(kind, count)
+        def sample():
+            start = time.perf_counter()
+            records = [game.apply(move) for game, move in pairs]
+            seconds = time.perf_counter() - start
+            for (game, move), record in zip(pairs, records):
+                game.undo(record)
+            return [seconds / count]
+        return repeat(sample)
+    bench.__doc__ = "Makes %s moves" % kind
+    return bench
+
+def bench_engine_undo(count):
+    """Undoes sampled moves of single cards, making them again before each
+    loop"""
+    pairs = sample_games(SINGLE, count)
+    def sample():
+        records = [(game, game.apply(move)) for game, move in pairs]
+        start = time.perf_counter()
+        for game, record in records:
+            game.undo(record)
+        return [(time.perf_counter() - start) / count]
+    return repeat(sample)
+
+def bench_engine_playout(count):
+    """Plays whole random games, one for every PLAYOUTS_PER_COUNT
+    operations of the other benchmarks"""
+    playouts = max(count // PLAYOUTS_PER_COUNT, 1)
+    def sample():
+        start = time.perf_counter()
+        for seed in range(playouts):
+            play_out(seed)
+        return [(time.perf_counter() - start) / playouts]
+    return repeat(sample)
+
+def play_out(seed):
+    """Plays random moves in a game until there are none or the game has
+    gone on too long"""
+    rng = Random(BENCH_SEED + seed)
+    game = Game(seed=seed)
+    for i in range(MAX_PLAYOUT_MOVES):
+        legal_moves = game.legal_moves()
+        if len(legal_moves) == 0:
+            return
+        game.apply(rng.choice(legal_moves))
+
+ENGINE_BENCHMARKS = [
+    ("engine_deal", bench_engine_deal),
+    ("engine_legal_moves", bench_engine_legal_moves),
+    ("engine_move_single", bench_engine_move(SINGLE)),
+    ("engine_move_run", bench_engine_move(RUN)),
+    ("engine_flip", bench_engine_move(DRAW)),
+    ("engine_reset", bench_engine_move(RESET)),
+    ("engine_undo", bench_engine_undo),
+    ("engine_playout", bench_engine_playout)
+]
+
+class BoardBench:
+    """Times the Tk paths of a board, in a window of its own. Every
+    operation includes the drawing Tk does before it is idle again. Each
+    operation takes a millisecond or more, so they are timed one at a time
+    and the position is set up between them without being timed"""
+
+    def __init__(self, root, canvas):
+        """Creates a board on the canvas or as a grid of widgets"""
+        import solitaire # Only imported when there is a display
+        from tkinter import Toplevel
+        self.root = root
+        self.window = Toplevel(root)
+        self.canvas = canvas
+        if canvas:
+            self.board = solitaire.CanvasBoard(self.window)
+        else:
+            self.board = solitaire.Board(self.window)
+        self.settle()
+
+    def settle(self):
+        """Makes the board and Tk draw everything that is waiting"""
+        self.board.flush()
+        self.root.update_idletasks()
+
+    def set_position(self, seed, moves):
+        """Deals a game and makes some moves, without timing them"""
+        self.board.restore_commands()
+        self.board.moving_card = None
+        self.board.deal(seed)
+        self.board.fast_forward(moves)
+        self.settle()
+
+    def select(self, card_id):
+        """Starts moving a card"""
+        if self.canvas:
+            self.board.prepare_move(card_id)
+        else:
+            self.board.prepare_move(self.board.card_list[card_id])
+
+    def move(self, move):
+        """Finishes moving the selected card"""
+        card_id, state, position = move
+        if self.canvas:
+            self.board.move_card(state, position)
+            return
+        target_cards = self.board.game.get_card_list(state, position)
+        if len(target_cards) != 0:
+            self.board.move_card(self.board.card_list[target_cards.peek()])
+        elif state == STATE_TOP_PILE:
+            self.board.pile_list[position].move_here()
+        else:
+            self.board.stack_list[position].move_here()
+
+    def flip(self):
+        """Flips or resets the deck"""
+        if self.canvas:
+            self.board.history.apply(FLIP)
+            self.board.schedule_update()
+        else:
+            self.board.deck.flip()
+
+    def bench_deal(self, count):
+        """Deals new games"""
+        def sample():
+            times = []
+            for seed in range(count):
+                timed(times, self.deal, seed)
+            return times
+        return repeat(sample)
+
+    def deal(self, seed):
+        """Deals a game and draws it"""
+        self.board.deal(seed)
+        self.settle()
+
+    def bench_prepare_move(self, count):
+        """Selects a card, outlining its targets"""
+        def sample():
+            times = []
+            for seed, moves, index in sample_moves(SINGLE, count):
+                self.set_position(seed, moves[:index])
+                timed(times, self.prepare_move, moves[index][0])
+            return times
+        return repeat(sample)
+
+    def prepare_move(self, card_id):
+        """Selects a card and draws the outlines"""
+        self.select(card_id)
+        self.root.update_idletasks()
+
+    def bench_restore_commands(self, count):
+        """Cancels the selection of a card"""
+        def sample():
+            times = []
+            for seed, moves, index in sample_moves(SINGLE, count):
+                self.set_position(seed, moves[:index])
+                self.prepare_move(moves[index][0])
+                timed(times, self.restore_commands)
+            return times
+        return repeat(sample)
+
+    def restore_commands(self):
+        """Cancels a selection and draws the board"""
+        self.board.restore_commands()
+        self.board.moving_card = None
+        self.root.update_idletasks()
+
+    def bench_move(self, kind):
+        """Returns a benchmark that moves sampled cards of a kind, after
+        selecting them"""
+        def bench(count):
+            def sample():
+                times = []
+                for seed, moves, index in sample_moves(kind, count):
+                    self.set_position(seed, moves[:index])
+                    self.select(moves[index][0])
+                    timed(times, self.make_move, moves[index])
+                return times
+            return repeat(sample)
+        bench.__doc__ = "Moves %s cards" % kind
+        return bench
+
+    def make_move(self, move):
+        """Moves the selected card and draws the result"""
+        self.move(move)
+        self.settle()
+
+    def bench_flip(self, kind):
+        """Returns a benchmark that flips the deck, drawing or resetting"""
+        def bench(count):
+            def sample():
+                times = []
+                for seed, moves, index in sample_moves(kind, count):
+                    self.set_position(seed, moves[:index])
+                    timed(times, self.make_flip)
+                return times
+            return repeat(sample)
+        bench.__doc__ = "Flips the deck to %s" % kind
+        return bench
+
+    def make_flip(self):
+        """Flips the deck and draws the result"""
+        self.flip()
+        self.settle()
+
+    def benchmarks(self):
+        """Returns the (name, function) pairs of the board benchmarks"""
+        prefix = "canvas_" if self.canvas else "grid_"
+        return [
+            (prefix + "deal", self.bench_deal),
+            (prefix + "prepare_move", self.bench_prepare_move),
+            (prefix + "restore_commands", self.bench_restore_commands),
+            (prefix + "move_single", self.bench_move(SINGLE)),
+            (prefix + "move_run", self.bench_move(RUN)),
+            (prefix + "flip", self.bench_flip(DRAW)),
+            (prefix + "reset", self.bench_flip(RESET))
+        ]
+
+def summarise(runs, count):
+    """Returns the operations per second, the median and best seconds per
+    operation of the loops of a benchmark, and the percentiles of every
+    time it took"""
+    loops = sorted(sum(times) / len(times) for times in runs)
+    median = loops[len(loops) // 2]
+    summary = {
+        "count": count,
+        "loops": len(loops),
+        "ops_per_second": 1 / median if median > 0 else 0.0,
+        "median_us": median * 1e6,
+        "best_us": loops[0] * 1e6
+    }
+    # Quick operations are timed a loop at a time, so their percentiles
+    # are of the loops rather than of single operations
+    times = sorted(time for times in runs for time in times)
+    summary["times"] = len(times)
+    for percentile in PERCENTILES:
+        index = min(len(times) - 1, percentile * len(times) // 100)
+        summary["p%d_us" % percentile] = times[index] * 1e6
+    return summary
+
+def run_benchmarks(benchmarks, count, only=None):
+    """Runs some benchmarks, printing each result. Returns a dictionary of
+    the summaries by name"""
+    results = {}
+    for name, bench in benchmarks:
+        if only is not None and only not in name:
+            continue
+        bench(WARMUP_COUNT)
+        summary = summarise(bench(count), count)
+        results[name] = summary
+        print("%-24s %10.0f ops/s  median %8.2f us  best %8.2f us  "
+              "p99 %8.2f us" % (name, summary["ops_per_second"],
+                                summary["median_us"], summary["best_us"],
+                                summary["p99_us"]))
+    return results
+
+def start_xvfb(display=XVFB_DISPLAY):
+    """Starts a virtual display and points Tk at it. Returns the process,
+    or None if Xvfb is not installed"""
+    if shutil.which("Xvfb") is None:
+        print("Xvfb is not installed")
+        return None
+    process = subprocess.Popen(["Xvfb", display, "-screen", "0",
+                                "1280x1024x24"],
+                               stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    socket = "/tmp/.X11-unix/X" + display.lstrip(":")
+    deadline = time.perf_counter() + XVFB_TIMEOUT
+    while not os.path.exists(socket) and time.perf_counter() < deadline:
+        time.sleep(0.05)
+    os.environ["DISPLAY"] = display
+    return process
+
+def run_tk_benchmarks(count, only=None):
+    """Runs the board benchmarks on both boards. Returns a dictionary of the
+    summaries by name, which is empty if there is no display"""
+    from tkinter import TclError, Tk
+    try:
+        root = Tk()
+    except TclError as error:
+        print("Skipping the board benchmarks:", error)
+        return {}
+    root.withdraw()
+    results = {}
+    for canvas in (False, True):
+        bench = BoardBench(root, canvas)
+        results.update(run_benchmarks(bench.benchmarks(), count, only))
+        bench.window.destroy()
+    root.destroy()
+    return results
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """Prints the change in time of each benchmark from a baseline, by the
+    median of their loops. Returns whether any benchmark takes longer than
+    the threshold allows"""
+    regressed = False
+    for name, summary in sorted(results.items()):
+        if name not in baseline:
+            print("%-24s new" % name)
+            continue
+        before = baseline[name]
+        change = summary["median_us"] / before["median_us"] - 1
+        flag = ""
+        if change > threshold:
+            flag = "  slower"
+            regressed = True
+        if before["count"] != summary["count"]:
+            flag += "  (different count)"
+        print("%-24s median %8.2f -> %8.2f us  %+6.1f%%%s" %
+              (name, before["median_us"], summary["median_us"], change * 100,
+               flag))
+    return regressed
+
+def main():
+    """Runs the benchmarks from the command line"""
+    parser = argparse.ArgumentParser(description="Times the game")
+    parser.add_argument("--output", default=None,
+                        help="save the results to a JSON file")
+    parser.add_argument("--baseline", default=None,
+                        help="compare with the results in a JSON file")
+    parser.add_argument("--threshold", type=float,
+                        default=REGRESSION_THRESHOLD,
+                        help="the slowdown that counts as a regression")
+    parser.add_argument("--only", default=None,
+                        help="only run benchmarks with this in their name")
+    parser.add_argument("--count", type=int, default=None,
+                        help="operations in each loop of a benchmark")
+    parser.add_argument("--tk", action="store_true",
+                        help="also time the boards, which needs a display")
+    parser.add_argument("--xvfb", action="store_true",
+                        help="run the boards on a virtual display")
+    args = parser.parse_args()
+
+    results = run_benchmarks(ENGINE_BENCHMARKS, args.count or DEFAULT_COUNT,
+                             args.only)
+    if args.tk or args.xvfb:
+        xvfb = start_xvfb() if args.xvfb else None
+        try:
+            results.update(run_tk_benchmarks(args.count or DEFAULT_TK_COUNT,
+                                             args.only))
+        finally:
+            if xvfb is not None:
+                xvfb.terminate()
+
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            json.dump({"version": RESULTS_VERSION,
+                       "python": platform.python_version(),
+                       "platform": platform.platform(),
+                       "benchmarks": results}, output_file, indent=2)
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get("version") != RESULTS_VERSION:
+            print("%s is not a version %d results file" %
+                  (args.baseline, RESULTS_VERSION))
+            sys.exit(2)
+        if compare(results, baseline["benchmarks"], args.threshold):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""bulk_deals.py
+Generates millions of deals at once with NumPy and measures them
+Created: 17.10.26
+
+Requires NumPy. Usage: python bulk_deals.py COUNT [--seed S] [--chunk C]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from engine import (BOARD_SIZE, CARD_NAMES, CARD_RED_TABLE, CARD_VALUE_TABLE,
+                    DECK_SIZE, NUM_SUITS, Game)
+
+CARD_VALUES = np.frombuffer(CARD_VALUE_TABLE, dtype=np.uint8)
+CARD_REDS = np.frombuffer(CARD_RED_TABLE, dtype=np.uint8).astype(bool)
+KING_VALUE = len(CARD_NAMES)
+DEFAULT_CHUNK = 1000000 # Deals generated at once by the command line
+
+def get_layout():
+    """Returns the indexes into a card order of the top of each stack, of
+    the hidden cards of each stack from the bottom up, and of the deck from
+    the bottom up, found by dealing the order 0 to 51 the way Board.deal
+    does"""
+    game = Game(list(range(DECK_SIZE)))
+    tops = [stack.peek() for stack in game.stack_cards]
+    hidden = [list(stack)[:game.hidden_counts[i]]
+              for i, stack in enumerate(game.stack_cards)]
+    deck = list(game.closed_deck_cards)
+    return tops, hidden, deck
+
+LAYOUT_TOPS, LAYOUT_HIDDEN, LAYOUT_DECK = get_layout()
+# Every hidden card, with the stack it is in and the number of hidden cards
+# above it
+HIDDEN_INDEXES = np.array([index for stack in LAYOUT_HIDDEN
+                           for index in stack], dtype=np.intp)
+HIDDEN_DEPTHS = np.array([len(stack) - i
+                          for stack in LAYOUT_HIDDEN
+                          for i in range(len(stack))], dtype=np.intp)
+TOP_INDEXES = np.array(LAYOUT_TOPS, dtype=np.intp)
+DECK_INDEXES = np.array(LAYOUT_DECK, dtype=np.intp)
+
+def bulk_orders(count, rng=None):
+    """Returns a (count, 52) array of card orders, each a shuffled deck laid
+    out like the list Board.deal shuffles"""
+    if rng is None:
+        rng = np.random.default_rng()
+    orders = np.broadcast_to(np.arange(DECK_SIZE, dtype=np.uint8),
+                             (count, DECK_SIZE))
+    return rng.permuted(orders, axis=1)
+
+def get_tops(orders):
+    """Returns a (count, 7) array of the face up card on each stack"""
+    return orders[:, TOP_INDEXES]
+
+def get_hidden(orders):
+    """Returns a (count, 21) array of the face down cards"""
+    return orders[:, HIDDEN_INDEXES]
+
+def get_deck(orders):
+    """Returns a (count, 24) array of the cards left in the deck, with the
+    first card to be drawn last"""
+    return orders[:, DECK_INDEXES]
+
+def playable_aces(orders):
+    """Returns the number of Aces that can go straight to the piles in each
+    deal"""
+    return (CARD_VALUES[get_tops(orders)] == 1).sum(axis=1)
+
+def buried_kings(orders):
+    """Returns the number of face down Kings in each deal"""
+    return (CARD_VALUES[get_hidden(orders)] == KING_VALUE).sum(axis=1)
+
+def buried_king_depths(orders):
+    """Returns how many deals have a face down King under each number of
+    hidden cards, counting the King itself"""
+    is_king = CARD_VALUES[get_hidden(orders)] == KING_VALUE
+    depths = np.broadcast_to(HIDDEN_DEPTHS, is_king.shape)[is_king]
+    return np.bincount(depths, minlength=BOARD_SIZE)
+
+def playable_tops(orders):
+    """Returns the number of face up cards in each deal that can be moved
+    straight away, either to a pile or onto another face up card"""
+    tops = get_tops(orders)
+    values = CARD_VALUES[tops].astype(np.int8)
+    reds = CARD_REDS[tops]
+    # Compares every pair of tops in each deal
+    fits = (values[:, None, :] == values[:, :, None] + 1) & \
+        (reds[:, None, :] != reds[:, :, None])
+    return (fits.any(axis=2) | (values == 1)).sum(axis=1)
+
+def summarise(orders):
+    """Returns the distribution of each statistic over the deals, as arrays
+    of the number of deals with each count"""
+    return {
+        "playable_aces": np.bincount(playable_aces(orders),
+                                     minlength=BOARD_SIZE + 1),
+        "buried_kings": np.bincount(buried_kings(orders),
+                                    minlength=NUM_SUITS + 1),
+        "buried_king_depths": buried_king_depths(orders),
+        "playable_tops": np.bincount(playable_tops(orders),
+                                     minlength=BOARD_SIZE + 1)
+    }
+
+def main():
+    """Measures a number of deals from the command line"""
+    parser = argparse.ArgumentParser(description="Measures random deals")
+    parser.add_argument("count", type=int, help="the number of deals")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--chunk", type=int, default=DEFAULT_CHUNK,
+                        help="deals generated at once")
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+    totals = {}
+    start_time = time.perf_counter()
+    for start in range(0, args.count, args.chunk):
+        orders = bulk_orders(min(args.chunk, args.count - start), rng)
+        for name, counts in summarise(orders).items():
+            if name in totals:
+                totals[name] = totals[name] + counts
+            else:
+                totals[name] = counts
+    seconds = time.perf_counter() - start_time
+    print("%d deals in %.2fs (%.0f deals/s)" %
+          (args.count, seconds, args.count / seconds))
+    for name, counts in totals.items():
+        print(name, counts.tolist())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,748 @@
+"""engine.py
+The rules of solitaire, without any user interface
+Based on the rules in solitaire.py by Daniel Harris
+Created: 17.10.26
+"""
+from array import array
+from hashlib import blake2b
+from math import factorial
+from random import shuffle
+
+CARD_SUITS = ("Spades", "Hearts", "Diamonds", "Clubs")
+RED_SUITS = (1, 2)
+NUM_SUITS = len(CARD_SUITS)
+BOARD_SIZE = NUM_SUITS + 3
+
+# Card States
+STATE_DECK = 0 # In the hidden part of the deck
+STATE_TOP_DECK = 1 # Just drawn from the deck
+STATE_USED_DECK = 2 # Was drawn from the deck but was not used and another
+# card was drawn
+STATE_BOARD = 3 # Hidden card on the board
+STATE_TOP_BOARD = 4 # At the very bottom of its section of the board
+STATE_VIS_BOARD = 5 # On the board and visible, but there are cards
+# underneath it
+STATE_PILE = 6 # On the pile with one or more cards on top
+STATE_TOP_PILE = 7 # On the top of the pile
+
+CARD_NAMES = {
+    1: "A",
+    2: "2",
+    3: "3",
+    4: "4",
+    5: "5",
+    6: "6",
+    7: "7",
+    8: "8",
+    9: "9",
+    10: "10",
+    11: "J",
+    12: "Q",
+    13: "K"
+}
+
+DECK_SIZE = NUM_SUITS * len(CARD_NAMES)
+
+# Lookup tables indexed by card id
+CARD_SUIT_TABLE = bytes(card_id % NUM_SUITS for card_id in range(DECK_SIZE))
+CARD_VALUE_TABLE = bytes(card_id // NUM_SUITS + 1
+                         for card_id in range(DECK_SIZE))
+CARD_RED_TABLE = bytes(card_id % NUM_SUITS in RED_SUITS
+                       for card_id in range(DECK_SIZE))
+# The key of the stack tops a card can be placed on, which is the next value
+# up in the other colour
+TARGET_KEY_TABLE = bytes((CARD_VALUE_TABLE[card_id] + 1) * 2 +
+                         1 - CARD_RED_TABLE[card_id]
+                         for card_id in range(DECK_SIZE))
+NUM_TOP_KEYS = (len(CARD_NAMES) + 2) * 2
+# The suits of the other colour to each suit
+OPPOSITE_SUITS = tuple(tuple(other for other in range(NUM_SUITS)
+                             if (other in RED_SUITS) != (suit in RED_SUITS))
+                       for suit in range(NUM_SUITS))
+SAFE_VALUE = 2 # Cards up to this value can always be moved to the piles
+
+# Every card container has a place number, which is stored for each card
+PLACE_DECK = 0
+PLACE_OPEN_DECK = 1
+PLACE_PILE = 2 # The first pile, followed by the others
+PLACE_STACK = PLACE_PILE + NUM_SUITS # The first stack, followed by the others
+NUM_PLACES = PLACE_STACK + BOARD_SIZE
+
+# A packed position starts with the deck and open deck sizes, the top card of
+# each pile and the size of each stack, followed by the cards in every
+# container except the piles
+PACKED_HEADER_SIZE = 2 + NUM_SUITS + BOARD_SIZE
+NO_PILE_CARD = 0xFF
+STACK_SIZE_BITS = 5 # The hidden count is stored above the stack size
+
+# Deal numbers are turned into card orders by scrambling them with a Feistel
+# network over two halves of DEAL_BITS bits and unranking the result. Each
+# round hashes one half into the other, so every bit of the deal number
+# changes every card. A result of DEAL_COUNT or more is scrambled again
+# until it is below, which keeps every deal number on a different deal.
+# Changing how deals are numbered must change DEAL_VERSION
+DEAL_VERSION = 2
+DEAL_COUNT = factorial(DECK_SIZE)
+DEAL_HALF_BITS = (DEAL_COUNT.bit_length() + 1) // 2
+DEAL_HALF_MASK = (1 << DEAL_HALF_BITS) - 1
+DEAL_HALF_BYTES = (DEAL_HALF_BITS + 7) // 8
+DEAL_ROUNDS = 6
+
+# A move is a tuple of (card id, target state, target position). Flipping the
+# deck has no card, so it uses this placeholder instead
+NO_CARD = -1
+FLIP = (NO_CARD, STATE_DECK, 0)
+
+# Undo records are packed into one 32 bit number for the history, with these
+# fields from the lowest bits up. The card is stored plus one, so that 0 is a
+# flip. A flip stores the number of cards it moved in the count, and sets
+# revealed if it drew a card rather than turning the open cards back
+RECORD_FIELDS = (("card", 6), ("state", 3), ("position", 3),
+                 ("prev_state", 3), ("prev_position", 3), ("prev_height", 6),
+                 ("count", 5), ("revealed", 1))
+
+def get_record_layout():
+    """Returns dictionaries of the shift and mask of each record field"""
+    shifts = {}
+    masks = {}
+    shift = 0
+    for name, bits in RECORD_FIELDS:
+        shifts[name] = shift
+        masks[name] = (1 << bits) - 1
+        shift += bits
+    return shifts, masks
+
+RECORD_SHIFTS, RECORD_MASKS = get_record_layout()
+
+def card_suit(card_id):
+    """Returns the suit number of a card"""
+    return CARD_SUIT_TABLE[card_id]
+
+def card_value(card_id):
+    """Returns the value of a card, from 1 (Ace) to 13 (King)"""
+    return CARD_VALUE_TABLE[card_id]
+
+def card_is_red(card_id):
+    """Returns whether a card is red"""
+    return CARD_RED_TABLE[card_id] == 1
+
+def top_key(card_id):
+    """Returns the key that indexes a stack by its top card, made from its
+    value and colour"""
+    return card_value(card_id) * 2 + CARD_RED_TABLE[card_id]
+
+def card_name(card_id):
+    """Returns the short name of a card, such as AS or 10H"""
+    return CARD_NAMES[card_value(card_id)] + CARD_SUITS[card_suit(card_id)][0]
+
+def deal_round(round_number, half):
+    """Returns the hash of one half of a deal number in a round of the
+    Feistel network"""
+    digest = blake2b(half.to_bytes(DEAL_HALF_BYTES, "little"),
+                     digest_size=DEAL_HALF_BYTES,
+                     person=b"solitaire deal %d" % round_number)
+    return int.from_bytes(digest.digest(), "little") & DEAL_HALF_MASK
+
+def scramble_deal(number):
+    """Returns the rank of the card order numbered by a deal number below
+    DEAL_COUNT. Every deal number has a different rank"""
+    while True:
+        left = number >> DEAL_HALF_BITS
+        right = number & DEAL_HALF_MASK
+        for round_number in range(DEAL_ROUNDS):
+            left, right = right, left ^ deal_round(round_number, right)
+        number = left << DEAL_HALF_BITS | right
+        if number < DEAL_COUNT:
+            return number
+
+def unscramble_deal(rank):
+    """Returns the deal number of the rank of a card order, undoing
+    scramble_deal"""
+    while True:
+        left = rank >> DEAL_HALF_BITS
+        right = rank & DEAL_HALF_MASK
+        for round_number in range(DEAL_ROUNDS - 1, -1, -1):
+            left, right = right ^ deal_round(round_number, left), left
+        rank = left << DEAL_HALF_BITS | right
+        if rank < DEAL_COUNT:
+            return rank
+
+def seeded_order(seed):
+    """Returns the card order of the deal numbered by a seed, which is the
+    same on every machine. Any seed from 0 to DEAL_COUNT - 1 gives a
+    different deal"""
+    rank = scramble_deal(seed % DEAL_COUNT)
+    cards = list(range(DECK_SIZE))
+    card_order = []
+    for i in range(DECK_SIZE, 0, -1):
+        rank, index = divmod(rank, i)
+        card_order.append(cards.pop(index))
+    return card_order
+
+def get_seed(card_order):
+    """Returns the seed of the deal with a card order"""
+    cards = list(range(DECK_SIZE))
+    rank = 0
+    scale = 1
+    for i, card_id in zip(range(DECK_SIZE, 0, -1), card_order):
+        index = cards.index(card_id)
+        cards.pop(index)
+        rank += index * scale
+        scale *= i
+    return unscramble_deal(rank)
+
+def pack_record(record):
+    """Returns an undo record as one number"""
+    move, details = record
+    card_id, state, position = move
+    if card_id == NO_CARD:
+        fields = (0, 0, 0, 0, 0, 0, abs(details), details > 0)
+    else:
+        fields = (card_id + 1, state, position) + tuple(details)
+    value = 0
+    for (name, bits), field in zip(RECORD_FIELDS, fields):
+        value |= int(field) << RECORD_SHIFTS[name]
+    return value
+
+def unpack_record(value):
+    """Returns the undo record packed into a number by pack_record"""
+    fields = [value >> RECORD_SHIFTS[name] & RECORD_MASKS[name]
+              for name, bits in RECORD_FIELDS]
+    card, state, position, prev_state, prev_position, prev_height, count, \
+        revealed = fields
+    if card == 0:
+        return (FLIP, count if revealed == 1 else -count)
+    return ((card - 1, state, position),
+            (prev_state, prev_position, prev_height, count, revealed == 1))
+
+class CardContainer:
+    """A class that holds card ids in a byte array"""
+
+    def __init__(self, cards=()):
+        """Creates a card containter"""
+        self.cards = array("B", cards)
+
+    def __str__(self):
+        """Returns a string representation of the container"""
+        return_string = ""
+        for card in self.cards:
+            return_string += card_name(card) + ", "
+        return return_string
+
+    def pop(self, pos=-1):
+        """Removes and returns a card, defaulting to the last one"""
+        return self.cards.pop(pos)
+
+    def peek(self, pos=-1):
+        """Returns a card, defaulting to the last one"""
+        return self.cards[pos]
+
+    def __len__(self):
+        """Returns the number of cards in the container"""
+        return len(self.cards)
+
+    def __iter__(self):
+        """Iterates over the cards from the bottom up"""
+        return iter(self.cards)
+
+    def append(self, other):
+        """A method to add a card to the container"""
+        self.cards.append(other)
+
+    def index(self, card_id):
+        """Returns the position of a card in the container"""
+        return self.cards.index(card_id)
+
+    def take(self, index):
+        """Removes and returns every card from an index to the top"""
+        run = self.cards[index:]
+        del self.cards[index:]
+        return run
+
+    def extend(self, run):
+        """Adds several cards to the top of the container"""
+        self.cards.extend(run)
+
+    def tobytes(self):
+        """Returns the cards as bytes"""
+        return self.cards.tobytes()
+
+class Game:
+    """The state of one game of solitaire"""
+
+    def __init__(self, card_order=None, seed=None):
+        """Creates a game and deals the cards"""
+        self.deal(card_order, seed)
+
+    def deal(self, card_order=None, seed=None):
+        """Deals the cards in the order given, or the order of a seed, or
+        shuffled if there is neither. The order matches the list that
+        Board.deal shuffles"""
+        if seed is not None:
+            card_order = seeded_order(seed)
+        elif card_order is None:
+            card_order = list(range(DECK_SIZE))
+            shuffle(card_order)
+        self.seed = seed
+        self.card_order = bytes(card_order)
+        self.reset_places()
+        self.closed_deck_cards.extend(self.card_order)
+
+        # Removes cards from the deck and places them on the board, in the
+        # same order as they are dealt by hand
+        for i in range(BOARD_SIZE):
+            self.stack_cards[i].append(self.closed_deck_cards.pop())
+            for j in range(i+1, BOARD_SIZE):
+                self.stack_cards[j].append(self.closed_deck_cards.pop())
+                self.hidden_counts[j] += 1
+        self.update_places()
+
+    def reset_places(self):
+        """Empties every card container"""
+        self.places = [CardContainer() for i in range(NUM_PLACES)]
+        self.closed_deck_cards = self.places[PLACE_DECK]
+        self.open_deck_cards = self.places[PLACE_OPEN_DECK]
+        self.pile_cards = self.places[PLACE_PILE:PLACE_STACK]
+        self.stack_cards = self.places[PLACE_STACK:]
+        self.hidden_counts = array("B", bytes(BOARD_SIZE)) # Face down cards
+        # in each stack
+        self.card_places = bytearray(DECK_SIZE) # The place of each card
+        self.dirty_places = set(range(NUM_PLACES)) # Places changed since
+        # the last call to take_dirty_places
+
+        # Indexes of the stacks by their top card's value and colour, and of
+        # the piles by their suit, so targets are found without a scan
+        self.stacks_by_top = [set() for i in range(NUM_TOP_KEYS)]
+        self.stack_top_keys = [0] * BOARD_SIZE # 0 for an empty stack
+        self.empty_stacks = set(range(BOARD_SIZE))
+        self.pile_by_suit = [-1] * NUM_SUITS
+
+    def update_places(self):
+        """Records the place of every card from the containers"""
+        for place, cards in enumerate(self.places):
+            for card_id in cards:
+                self.card_places[card_id] = place
+        for position in range(BOARD_SIZE):
+            self.update_stack_index(position)
+        for position, pile in enumerate(self.pile_cards):
+            if len(pile) != 0:
+                self.pile_by_suit[card_suit(pile.peek())] = position
+
+    def take_dirty_places(self):
+        """Returns the places changed since the last call, so that a view
+        only has to update those"""
+        dirty_places = self.dirty_places
+        self.dirty_places = set()
+        return dirty_places
+
+    def update_stack_index(self, position):
+        """Records the new top card of a stack in the index"""
+        stack = self.stack_cards[position]
+        key = top_key(stack.peek()) if len(stack) != 0 else 0
+        old_key = self.stack_top_keys[position]
+        if key != old_key:
+            if old_key == 0:
+                self.empty_stacks.discard(position)
+            else:
+                self.stacks_by_top[old_key].discard(position)
+            if key == 0:
+                self.empty_stacks.add(position)
+            else:
+                self.stacks_by_top[key].add(position)
+            self.stack_top_keys[position] = key
+
+    def update_pile_index(self, position, suit):
+        """Records whether a pile holds a suit in the index"""
+        if len(self.pile_cards[position]) != 0:
+            self.pile_by_suit[suit] = position
+        else:
+            self.pile_by_suit[suit] = -1
+
+    def pack(self):
+        """Returns the position as at most 65 bytes, which can be stored and
+        copied cheaply and passed to from_bytes"""
+        header = bytearray(PACKED_HEADER_SIZE)
+        header[0] = len(self.closed_deck_cards)
+        header[1] = len(self.open_deck_cards)
+        for i, pile in enumerate(self.pile_cards):
+            header[2 + i] = pile.peek() if len(pile) != 0 else NO_PILE_CARD
+        for i, stack in enumerate(self.stack_cards):
+            header[2 + NUM_SUITS + i] = \
+                self.hidden_counts[i] << STACK_SIZE_BITS | len(stack)
+        return b"".join([bytes(header), self.closed_deck_cards.tobytes(),
+                         self.open_deck_cards.tobytes()] +
+                        [stack.tobytes() for stack in self.stack_cards])
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Creates a game from a position returned by pack"""
+        game = cls.__new__(cls)
+        game.seed = None
+        game.card_order = None
+        game.reset_places()
+        start = PACKED_HEADER_SIZE
+        end = start + data[0]
+        game.closed_deck_cards.extend(data[start:end])
+        start, end = end, end + data[1]
+        game.open_deck_cards.extend(data[start:end])
+        for i, pile in enumerate(game.pile_cards):
+            top = data[2 + i]
+            if top != NO_PILE_CARD:
+                pile.extend(range(card_suit(top), top + 1, NUM_SUITS))
+        for i, stack in enumerate(game.stack_cards):
+            size = data[2 + NUM_SUITS + i]
+            game.hidden_counts[i] = size >> STACK_SIZE_BITS
+            start, end = end, end + (size & ((1 << STACK_SIZE_BITS) - 1))
+            stack.extend(data[start:end])
+        game.update_places()
+        return game
+
+    def copy(self):
+        """Returns an independent copy of the position"""
+        return Game.from_bytes(self.pack())
+
+    def get_card_list(self, state, position):
+        """Returns the container holding cards in the given state"""
+        if state == STATE_TOP_PILE or state == STATE_PILE:
+            return self.pile_cards[position]
+        elif state == STATE_TOP_DECK or state == STATE_USED_DECK:
+            return self.open_deck_cards
+        elif state == STATE_DECK:
+            return self.closed_deck_cards
+        else:
+            return self.stack_cards[position]
+
+    def get_place_position(self, place, height):
+        """Returns the state, position and height of the card at a height in
+        a place"""
+        cards = self.places[place]
+        top = len(cards) - 1
+        if place == PLACE_DECK:
+            return (STATE_DECK, 0, height)
+        elif place == PLACE_OPEN_DECK:
+            state = STATE_TOP_DECK if height == top else STATE_USED_DECK
+            return (state, 0, height)
+        elif place < PLACE_STACK:
+            state = STATE_TOP_PILE if height == top else STATE_PILE
+            return (state, place - PLACE_PILE, height)
+        position = place - PLACE_STACK
+        if height < self.hidden_counts[position]:
+            state = STATE_BOARD
+        elif height == top:
+            state = STATE_TOP_BOARD
+        else:
+            state = STATE_VIS_BOARD
+        return (state, position, height)
+
+    def positions(self):
+        """Returns a dictionary of every card id to its state, position and
+        height"""
+        positions = {}
+        for place, cards in enumerate(self.places):
+            for height, card_id in enumerate(cards):
+                positions[card_id] = self.get_place_position(place, height)
+        return positions
+
+    def get_position(self, card_id):
+        """Returns a tuple containing the state, position and height of a
+        card"""
+        place = self.card_places[card_id]
+        return self.get_place_position(place,
+                                       self.places[place].index(card_id))
+
+    def is_won(self):
+        """Returns whether every card has been moved to the piles"""
+        return sum(len(pile) for pile in self.pile_cards) == DECK_SIZE
+
+    def pile_value(self, suit):
+        """Returns the value of the top card on the pile of a suit, or 0 if
+        the suit has no pile yet"""
+        position = self.pile_by_suit[suit]
+        if position == -1:
+            return 0
+        return len(self.pile_cards[position])
+
+    def is_safe_to_pile(self, card_id):
+        """Returns whether moving a card to a pile can never lose the game,
+        because both cards that could be placed on it are already on the
+        piles"""
+        value = card_value(card_id)
+        if value <= SAFE_VALUE:
+            return True
+        for suit in OPPOSITE_SUITS[card_suit(card_id)]:
+            if self.pile_value(suit) < value - 1:
+                return False
+        return True
+
+    def pile_target(self, card_id):
+        """Returns the position of the pile a card can go on, or -1 if it
+        cannot go on any"""
+        value = card_value(card_id)
+        if value == 1:
+            for i, pile in enumerate(self.pile_cards):
+                if len(pile) == 0:
+                    return i
+            return -1
+        position = self.pile_by_suit[card_suit(card_id)]
+        if position != -1 and len(self.pile_cards[position]) + 1 == value:
+            return position
+        return -1
+
+    def pile_moves(self):
+        """Returns the moves of the top card of the deck and of each stack to
+        the piles"""
+        tops = [stack.peek() for stack in self.stack_cards if len(stack) != 0]
+        if len(self.open_deck_cards) != 0:
+            tops.append(self.open_deck_cards.peek())
+        moves = []
+        for card_id in tops:
+            position = self.pile_target(card_id)
+            if position != -1:
+                moves.append((card_id, STATE_TOP_PILE, position))
+        return moves
+
+    def is_cascade(self):
+        """Returns whether the game can be won by moving cards to the piles
+        and flipping the deck, which is the case once no card is hidden. The
+        lowest card left is then always on top of a stack or in the deck"""
+        return sum(self.hidden_counts) == 0
+
+    def auto_move(self):
+        """Returns a move to the piles that can never lose the game, or while
+        the game is a cascade, any move to the piles or a flip of the deck.
+        Returns None if there is no such move"""
+        moves = self.pile_moves()
+        for move in moves:
+            if self.is_safe_to_pile(move[0]):
+                return move
+        if not self.is_cascade() or self.is_won():
+            return None
+        if len(moves) != 0:
+            return moves[0]
+        return FLIP
+
+    def can_flip(self):
+        """Returns whether the deck can be flipped or reset"""
+        return len(self.closed_deck_cards) != 0 or \
+            len(self.open_deck_cards) != 0
+
+    def card_moves(self, card_id):
+        """Returns a list of (state, position) targets the card can move to"""
+        state, position, height = self.get_position(card_id)
+        if state not in [STATE_TOP_DECK, STATE_TOP_BOARD, STATE_VIS_BOARD]:
+            return []
+        return self.card_targets(card_id, state, position)
+
+    def card_targets(self, card_id, state, position):
+        """Returns the targets of a visible card using the indexes"""
+        value = card_value(card_id)
+        targets = []
+
+        # Only single cards can move to a pile
+        if state != STATE_VIS_BOARD:
+            if value == 1:
+                for i, pile in enumerate(self.pile_cards):
+                    if len(pile) == 0:
+                        targets.append((STATE_TOP_PILE, i))
+            else:
+                pile_position = self.pile_by_suit[card_suit(card_id)]
+                if pile_position != -1 and \
+                   len(self.pile_cards[pile_position]) + 1 == value:
+                    targets.append((STATE_TOP_PILE, pile_position))
+
+        if value == len(CARD_NAMES):
+            stacks = self.empty_stacks
+        else:
+            stacks = self.stacks_by_top[TARGET_KEY_TABLE[card_id]]
+        for i in stacks:
+            if state == STATE_TOP_DECK or i != position:
+                targets.append((STATE_TOP_BOARD, i))
+        return targets
+
+    def legal_moves(self):
+        """Returns a list of every legal move, including flipping the deck"""
+        moves = []
+        if len(self.open_deck_cards) != 0:
+            card_id = self.open_deck_cards.peek()
+            for state, position in self.card_targets(card_id, STATE_TOP_DECK,
+                                                     0):
+                moves.append((card_id, state, position))
+        for position, stack in enumerate(self.stack_cards):
+            top = len(stack) - 1
+            for i in range(self.hidden_counts[position], top + 1):
+                card_id = stack.peek(i)
+                state = STATE_TOP_BOARD if i == top else STATE_VIS_BOARD
+                for target in self.card_targets(card_id, state, position):
+                    moves.append((card_id,) + target)
+        if self.can_flip():
+            moves.append(FLIP)
+        return moves
+
+    def is_legal(self, move):
+        """Returns whether a move can be made"""
+        card_id, state, position = move
+        if card_id == NO_CARD:
+            return self.can_flip()
+        return (state, position) in self.card_moves(card_id)
+
+    def apply(self, move):
+        """Makes a move and returns a record that can be passed to undo"""
+        card_id, state, position = move
+        if card_id == NO_CARD:
+            return self.flip()
+        return self.move(card_id, state, position)
+
+    def flip(self):
+        """Moves a card from the deck to the top of the deck if possible.
+        Otherwise this refreshes the deck. Returns an undo record"""
+        if len(self.closed_deck_cards) != 0:
+            card_id = self.closed_deck_cards.pop()
+            self.open_deck_cards.append(card_id)
+            self.card_places[card_id] = PLACE_OPEN_DECK
+            self.dirty_places.update((PLACE_DECK, PLACE_OPEN_DECK))
+            return (FLIP, 1)
+        # Putting the open cards back in reverse keeps the drawing order
+        count = len(self.open_deck_cards)
+        for i in range(count):
+            card_id = self.open_deck_cards.pop()
+            self.closed_deck_cards.append(card_id)
+            self.card_places[card_id] = PLACE_DECK
+        self.dirty_places.update((PLACE_DECK, PLACE_OPEN_DECK))
+        return (FLIP, -count)
+
+    def move(self, card_id, state, position):
+        """Moves a card, and any cards on top of it, to the top of a pile or
+        stack. Returns an undo record"""
+        prev_state, prev_position, prev_height = self.get_position(card_id)
+        self.dirty_places.add(self.card_places[card_id])
+        home_list = self.get_card_list(prev_state, prev_position)
+        run = home_list.take(prev_height)
+        self.get_card_list(state, position).extend(run)
+        place = PLACE_PILE + position if state == STATE_TOP_PILE \
+            else PLACE_STACK + position
+        for moved_id in run:
+            self.card_places[moved_id] = place
+        self.dirty_places.add(place)
+        if state == STATE_TOP_PILE:
+            self.update_pile_index(position, card_suit(card_id))
+        else:
+            self.update_stack_index(position)
+
+        # Turns over the hidden card underneath, if there is one
+        revealed = False
+        if prev_state in [STATE_TOP_BOARD, STATE_VIS_BOARD]:
+            hidden = self.hidden_counts[prev_position]
+            if hidden != 0 and hidden == len(home_list):
+                self.hidden_counts[prev_position] -= 1
+                revealed = True
+            self.update_stack_index(prev_position)
+        return ((card_id, state, position),
+                (prev_state, prev_position, prev_height, len(run), revealed))
+
+    def undo(self, record):
+        """Reverses a move made by apply, move or flip"""
+        move, details = record
+        card_id, state, position = move
+        if card_id == NO_CARD:
+            if details > 0:
+                card_id = self.open_deck_cards.pop()
+                self.closed_deck_cards.append(card_id)
+                self.card_places[card_id] = PLACE_DECK
+            else:
+                for i in range(-details):
+                    card_id = self.closed_deck_cards.pop()
+                    self.open_deck_cards.append(card_id)
+                    self.card_places[card_id] = PLACE_OPEN_DECK
+            self.dirty_places.update((PLACE_DECK, PLACE_OPEN_DECK))
+            return
+        prev_state, prev_position, prev_height, count, revealed = details
+        target_list = self.get_card_list(state, position)
+        self.dirty_places.add(self.card_places[card_id])
+        run = target_list.take(len(target_list) - count)
+        self.get_card_list(prev_state, prev_position).extend(run)
+        if prev_state == STATE_TOP_DECK:
+            place = PLACE_OPEN_DECK
+        else:
+            place = PLACE_STACK + prev_position
+        for moved_id in run:
+            self.card_places[moved_id] = place
+        self.dirty_places.add(place)
+        if revealed:
+            self.hidden_counts[prev_position] += 1
+        if place != PLACE_OPEN_DECK:
+            self.update_stack_index(prev_position)
+        if state == STATE_TOP_PILE:
+            self.update_pile_index(position, card_suit(card_id))
+        else:
+            self.update_stack_index(position)
+
+class History:
+    """The moves made in a game, which can be undone and redone. Each move is
+    kept as its packed undo record, so undoing or redoing a move costs the
+    same as making it, and the history grows by 4 bytes a move. Every
+    change can also be written to a MoveLog"""
+
+    def __init__(self, game, log=None):
+        """Creates an empty history for a game"""
+        self.game = game
+        self.log = log
+        self.done = array("I") # Packed records of the moves made, in order
+        self.undone = array("I") # Packed records of the moves undone, with
+        # the next move to redo last
+
+    def __len__(self):
+        """Returns the number of moves that can be undone"""
+        return len(self.done)
+
+    def apply(self, move):
+        """Makes a move and records it, forgetting any undone moves. Returns
+        the undo record"""
+        record = self.game.apply(move)
+        self.done.append(pack_record(record))
+        del self.undone[:]
+        if self.log is not None:
+            self.log.write(move)
+        return record
+
+    def can_undo(self):
+        """Returns whether there is a move to undo"""
+        return len(self.done) != 0
+
+    def can_redo(self):
+        """Returns whether there is an undone move to make again"""
+        return len(self.undone) != 0
+
+    def undo(self):
+        """Undoes the last move. Returns its record, or None if there was no
+        move to undo"""
+        if len(self.done) == 0:
+            return None
+        value = self.done.pop()
+        record = unpack_record(value)
+        self.game.undo(record)
+        self.undone.append(value)
+        if self.log is not None:
+            self.log.write_undo()
+        return record
+
+    def redo(self):
+        """Makes the last undone move again. Returns its record, or None if
+        there was no move to redo"""
+        if len(self.undone) == 0:
+            return None
+        value = self.undone.pop()
+        move = unpack_record(value)[0]
+        record = self.game.apply(move)
+        self.done.append(value)
+        if self.log is not None:
+            self.log.write(move)
+        return record
+
+    def moves(self):
+        """Returns the moves that were made, in order"""
+        return [unpack_record(value)[0] for value in self.done]
+
+    def clear(self):
+        """Forgets every move"""
+        del self.done[:]
+        del self.undone[:]
@@ -0,0 +1,356 @@
+"""fuzz.py
+Plays random moves, undos and redos on seeded deals, checking the game after
+every one, and shrinks any failure to a short move log
+Created: 17.10.26
+
+Usage: python fuzz.py [--actions N] [--seed N] [--workers N] [--output LOG]
+
+Every view moves cards through Game.apply and History, so fuzzing those
+covers the rules of selecting and moving cards and of flipping the deck.
+After each action the places it changed are checked, and every place is
+compared with a plain model that makes the same moves with lists. After
+each deal the whole game is checked. A failing deal is shrunk by removing
+actions while it still fails, and saved as a move log that movelog.py can
+replay.
+"""
+import argparse
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from batch import map_chunks
+from engine import (DECK_SIZE, NO_CARD, NUM_PLACES, PLACE_DECK,
+                    PLACE_OPEN_DECK, PLACE_PILE, PLACE_STACK, STATE_TOP_PILE,
+                    Game, History, card_is_red, card_suit, card_value,
+                    top_key, unpack_record)
+from movelog import UNDO, MoveLog
+
+DEFAULT_ACTIONS = 1000000
+DEFAULT_OUTPUT = "fuzz.log"
+GAME_ACTIONS = 500 # Actions played on each deal
+CHUNK_SIZE = 20 # Deals sent to a worker at once
+UNDO_CHANCE = 0.1
+REDO_CHANCE = 0.05
+
+class ModelGame:
+    """The cards of each place and the hidden count of each stack, kept in
+    plain lists and moved by following the rules directly. Undo and redo
+    restore copies saved before each move, so the model shares nothing with
+    the game it is checked against"""
+
+    def __init__(self, game):
+        """Copies the places of a newly dealt game"""
+        self.places = [list(cards) for cards in game.places]
+        self.hidden_counts = list(game.hidden_counts)
+        self.done = [] # Copies saved before each move
+        self.undone = [] # Copies saved before each undo
+
+    def copy(self):
+        """Returns a copy of the places and hidden counts"""
+        return [list(cards) for cards in self.places], list(self.hidden_counts)
+
+    def apply(self, move):
+        """Makes a legal move"""
+        self.done.append(self.copy())
+        self.undone = []
+        card_id, state, position = move
+        deck = self.places[PLACE_DECK]
+        open_deck = self.places[PLACE_OPEN_DECK]
+        if card_id == NO_CARD:
+            if len(deck) != 0:
+                open_deck.append(deck.pop())
+            else:
+                deck.extend(reversed(open_deck))
+                del open_deck[:]
+            return
+        for place, cards in enumerate(self.places):
+            if card_id in cards:
+                break
+        height = cards.index(card_id)
+        run = cards[height:]
+        del cards[height:]
+        if state == STATE_TOP_PILE:
+            self.places[PLACE_PILE + position].extend(run)
+        else:
+            self.places[PLACE_STACK + position].extend(run)
+        if place >= PLACE_STACK:
+            stack_position = place - PLACE_STACK
+            if 0 < len(cards) == self.hidden_counts[stack_position]:
+                self.hidden_counts[stack_position] -= 1
+
+    def undo(self):
+        """Goes back to before the last move"""
+        self.undone.append(self.copy())
+        self.places, self.hidden_counts = self.done.pop()
+
+    def redo(self):
+        """Goes forward to after the last undone move"""
+        self.done.append(self.copy())
+        self.places, self.hidden_counts = self.undone.pop()
+
+    def check(self, game):
+        """Returns a description of the first place where a game differs
+        from the model, or None if it does not"""
+        for place, cards in enumerate(self.places):
+            if list(game.places[place]) != cards:
+                return "place %d holds different cards from the model" % place
+        for position, hidden in enumerate(self.hidden_counts):
+            if game.hidden_counts[position] != hidden:
+                return "stack %d has %d hidden cards but the model has %d" % (
+                    position, game.hidden_counts[position], hidden)
+        return None
+
+def check_place(game, place):
+    """Returns a description of the first thing wrong with a place, or None
+    if nothing is"""
+    cards = game.places[place]
+    if len(set(cards)) != len(cards):
+        return "place %d holds a card more than once" % place
+    for card_id in cards:
+        if game.card_places[card_id] != place:
+            return "card %d is in place %d but is recorded in place %d" % (
+                card_id, place, game.card_places[card_id])
+
+    if PLACE_PILE <= place < PLACE_STACK:
+        for height, card_id in enumerate(cards):
+            if card_value(card_id) != height + 1 or \
+               card_suit(card_id) != card_suit(cards.peek(0)):
+                return "pile %d is out of order at height %d" % (
+                    place - PLACE_PILE, height)
+        if len(cards) != 0 and \
+           game.pile_by_suit[card_suit(cards.peek(0))] != place - PLACE_PILE:
+            return "pile %d is not indexed by its suit" % (place - PLACE_PILE)
+    elif place >= PLACE_STACK:
+        position = place - PLACE_STACK
+        hidden = game.hidden_counts[position]
+        if hidden > len(cards) or (hidden == len(cards) and hidden != 0):
+            return "stack %d has %d cards and %d hidden" % (
+                position, len(cards), hidden)
+        for height in range(hidden + 1, len(cards)):
+            card_id = cards.peek(height)
+            under_id = cards.peek(height - 1)
+            if card_value(card_id) + 1 != card_value(under_id) or \
+               card_is_red(card_id) == card_is_red(under_id):
+                return "stack %d is out of order at height %d" % (position,
+                                                                  height)
+        key = top_key(cards.peek()) if len(cards) != 0 else 0
+        indexed = game.empty_stacks if key == 0 else game.stacks_by_top[key]
+        if game.stack_top_keys[position] != key or position not in indexed:
+            return "stack %d is not indexed by its top card" % position
+    return None
+
+def check_places(game, places):
+    """Returns a description of the first thing wrong with some places or
+    the number of cards, or None if nothing is"""
+    count = sum(len(cards) for cards in game.places)
+    if count != DECK_SIZE:
+        return "there are %d cards" % count
+    for place in places:
+        problem = check_place(game, place)
+        if problem is not None:
+            return problem
+    return None
+
+def check_game(game):
+    """Returns a description of the first thing wrong with the whole game,
+    or None if nothing is"""
+    problem = check_places(game, range(NUM_PLACES))
+    if problem is not None:
+        return problem
+    cards = set()
+    for place_cards in game.places:
+        cards.update(place_cards)
+    if len(cards) != DECK_SIZE:
+        return "there are %d different cards" % len(cards)
+    indexed = sum(len(stacks) for stacks in game.stacks_by_top) + \
+        len(game.empty_stacks)
+    if indexed != len(game.stack_cards):
+        return "%d stacks are indexed" % indexed
+    piled = sum(position != -1 for position in game.pile_by_suit)
+    if piled != sum(len(pile) != 0 for pile in game.pile_cards):
+        return "%d suits are indexed on the piles" % piled
+    packed = game.pack()
+    if Game.from_bytes(packed).pack() != packed:
+        return "the packed game does not unpack to the same game"
+    return None
+
+def redo_move(history):
+    """Returns the move the next redo makes, or None if there is none"""
+    if not history.can_redo():
+        return None
+    return unpack_record(history.undone[-1])[0]
+
+def random_action(history, rng):
+    """Returns a random undo, redo or legal move, with UNDO for an undo and
+    the move it makes for a redo. With no legal move left, it undoes"""
+    roll = rng.random()
+    if roll < UNDO_CHANCE and history.can_undo():
+        return UNDO
+    if roll < UNDO_CHANCE + REDO_CHANCE and history.can_redo():
+        return redo_move(history)
+    moves = history.game.legal_moves()
+    return rng.choice(moves) if len(moves) != 0 else UNDO
+
+def play(seed, actions, skip_illegal=False):
+    """Plays a list of actions on a deal, or random ones if actions is an
+    int, checking the game after each. Returns the list of actions played
+    up to the first failure and a description of the failure, which is None
+    if nothing went wrong. An action that is not legal ends the list early,
+    or is left out if skip_illegal is True"""
+    game = Game(seed=seed)
+    history = History(game)
+    model = ModelGame(game)
+    rng = random.Random(seed)
+    count = actions if isinstance(actions, int) else len(actions)
+    played = []
+    game.take_dirty_places()
+    problem = check_game(game)
+    for i in range(count):
+        if problem is not None:
+            break
+        if isinstance(actions, int):
+            action = random_action(history, rng)
+        else:
+            action = actions[i]
+        if action is UNDO:
+            if not history.can_undo():
+                if skip_illegal:
+                    continue
+                break
+            history.undo()
+            model.undo()
+        elif action == redo_move(history):
+            history.redo()
+            model.redo()
+        elif game.is_legal(action):
+            history.apply(action)
+            model.apply(action)
+        elif skip_illegal:
+            continue
+        else:
+            break
+        played.append(action)
+        problem = check_places(game, game.take_dirty_places())
+        if problem is None:
+            problem = model.check(game)
+    if problem is None:
+        problem = check_game(game)
+    return played, problem
+
+def problem_kind(problem):
+    """Returns a description of a failure without its numbers, so that the
+    same failure can be recognised in another place"""
+    return " ".join(word for word in problem.split() if not word.isdigit())
+
+def shrink(seed, actions, problem):
+    """Removes actions from a failing list while it still fails in the same
+    way, returning the shortest list found. Actions that removing others
+    makes illegal are left out too"""
+    kind = problem_kind(problem)
+
+    def failing(candidate):
+        """Returns the actions of a candidate that were played if it still
+        fails, or None"""
+        played, new_problem = play(seed, candidate, True)
+        if new_problem is None or problem_kind(new_problem) != kind:
+            return None
+        return played
+
+    chunks = 2
+    while len(actions) >= 2:
+        size = (len(actions) + chunks - 1) // chunks
+        for start in range(0, len(actions), size):
+            candidate = actions[:start] + actions[start + size:]
+            played = failing(candidate)
+            if played is not None:
+                actions = played
+                chunks = max(chunks - 1, 2)
+                break
+        else:
+            if size == 1:
+                break
+            chunks = min(chunks * 2, len(actions))
+    return actions
+
+def fuzz_seeds(seeds, game_actions):
+    """Plays random actions on some deals in a worker. Returns the number of
+    actions played and the (seed, actions, problem) of the first failure,
+    or None"""
+    total = 0
+    for seed in seeds:
+        played, problem = play(seed, game_actions)
+        total += len(played)
+        if problem is not None:
+            return total, (seed, played, problem)
+    return total, None
+
+def write_log(path, seed, actions):
+    """Saves the actions of a deal as a move log, replacing the file, so
+    that the deal is always game 0 of the log"""
+    if os.path.exists(path):
+        os.remove(path)
+    log = MoveLog(path)
+    log.start_game(Game(seed=seed))
+    for action in actions:
+        if action is UNDO:
+            log.write_undo()
+        else:
+            log.write(action)
+    log.close()
+
+def run(actions, first_seed, output, workers=None,
+        game_actions=GAME_ACTIONS):
+    """Fuzzes deals from a seed until about a number of actions have been
+    played or something fails. A failure is shrunk and saved to output.
+    Returns the description of the failure, or None"""
+    deals = max(actions // game_actions, 1)
+    failure = None
+    total = 0
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(workers) as pool:
+        for played, chunk_failure in map_chunks(
+                pool, partial(fuzz_seeds, game_actions=game_actions),
+                range(first_seed, first_seed + deals), CHUNK_SIZE, workers):
+            total += played
+            if chunk_failure is not None:
+                failure = chunk_failure
+                # The chunks still waiting are dropped
+                pool.shutdown(cancel_futures=True)
+                break
+    seconds = time.perf_counter() - start_time
+    print("Played %d actions in %.1fs (%.0f actions/min)" %
+          (total, seconds, total * 60 / seconds if seconds else 0.0))
+    if failure is None:
+        print("No problems found")
+        return None
+
+    seed, played, problem = failure
+    print("Seed %d failed after %d actions: %s" % (seed, len(played),
+                                                    problem))
+    played = shrink(seed, played, problem)
+    problem = play(seed, played)[1]
+    write_log(output, seed, played)
+    print("Shrunk to %d actions: %s" % (len(played), problem))
+    print("Saved to %s, replay it with: python movelog.py %s --game 0" %
+          (output, output))
+    return problem
+
+def main():
+    """Fuzzes the game from the command line"""
+    parser = argparse.ArgumentParser(description="Fuzzes the move rules")
+    parser.add_argument("--actions", type=int, default=DEFAULT_ACTIONS,
+                        help="the number of actions to play")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="the seed of the first deal")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes, one per core by default")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT,
+                        help="the move log to save a failure to")
+    args = parser.parse_args()
+    if run(args.actions, args.seed, args.output, args.workers) is not None:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
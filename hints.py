@@ -0,0 +1,105 @@
+"""hints.py
+Searches for the next move from a board's position without blocking Tk
+Created: 17.10.26
+"""
+import threading
+
+from solver import SOLVED, UNSOLVABLE, SolveResult, Solver
+
+POLL_MS = 50 # How often the window checks for a finished search
+HINT_NODES = 200000
+HINT_SECONDS = 20.0
+
+class HintSearch:
+    """Runs the solver on a worker thread, one search at a time. Tk is only
+    used from the main thread, which polls for the result with after"""
+
+    def __init__(self, window, on_result, max_nodes=HINT_NODES,
+                 max_seconds=HINT_SECONDS):
+        """Creates a search that passes each SolveResult to on_result in the
+        main thread"""
+        self.window = window
+        self.on_result = on_result
+        self.solver = Solver(max_nodes, max_seconds)
+        self.thread = None
+        self.stop = None # The event that cancels the running search
+        self.result = None # Set by the worker when its search ends
+        self.poll_id = None
+        self.lost_order = None # The deal of the last search, if it ended
+        # unsolvable
+        self.solution = [] # The winning moves of the last solved search
+        self.solution_positions = {} # The index into the solution of each
+        # packed position it passes through
+
+    def start(self, game):
+        """Cancels any running search and starts one from a game's position.
+        If the position is on the way of the last solution, the rest of that
+        solution is used without searching"""
+        self.cancel()
+        index = self.solution_positions.get(game.pack())
+        if index is not None:
+            self.result = SolveResult(SOLVED, self.solution[index:], 0, 0.0)
+            self.poll_id = self.window.after_idle(self.poll)
+            return
+
+        # Every position reached by a search that ended unsolvable is lost,
+        # so only then does its table still hold in another search. Any
+        # other search also remembers positions that only failed because
+        # their way to a win went back through its own path
+        keep_table = game.card_order == self.lost_order
+        self.lost_order = None
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self.run,
+                                       args=(game.copy(), keep_table,
+                                             self.stop),
+                                       daemon=True)
+        self.thread.start()
+        self.poll_id = self.window.after(POLL_MS, self.poll)
+
+    def run(self, game, keep_table, stop):
+        """Searches in the worker thread"""
+        result = self.solver.solve(game, keep_table, stop)
+        if result.status == SOLVED:
+            self.remember_solution(game, result.moves)
+        elif result.status == UNSOLVABLE:
+            self.lost_order = game.card_order
+        if not stop.is_set():
+            self.result = result
+
+    def remember_solution(self, game, moves):
+        """Records the positions a solution passes through, so that a later
+        search from any of them can reuse it"""
+        game = game.copy()
+        positions = {game.pack(): 0}
+        for i, move in enumerate(moves):
+            game.apply(move)
+            positions[game.pack()] = i + 1
+        self.solution = moves
+        self.solution_positions = positions
+
+    def poll(self):
+        """Passes on the result once the search has finished, checking again
+        later if it has not"""
+        self.poll_id = None
+        if self.result is None:
+            self.poll_id = self.window.after(POLL_MS, self.poll)
+            return
+        result = self.result
+        self.result = None
+        self.on_result(result)
+
+    def cancel(self):
+        """Stops the running search and forgets its result"""
+        if self.poll_id is not None:
+            self.window.after_cancel(self.poll_id)
+            self.poll_id = None
+        if self.thread is not None:
+            self.stop.set()
+            # The solver checks for the stop often, so this is quick
+            self.thread.join()
+            self.thread = None
+        self.result = None
+
+    def is_running(self):
+        """Returns whether a search is waiting for its result"""
+        return self.poll_id is not None
@@ -0,0 +1,105 @@
+"""images.py
+A shared cache of the card images
+Created: 17.10.26
+"""
+import os
+from collections import OrderedDict
+from fractions import Fraction
+from tkinter import PhotoImage
+
+from engine import card_name
+
+CARD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           "card_folder")
+EMPTY_NAME = "empty"
+BACK_NAME = "red_back"
+MAX_SCALED_IMAGES = 128
+MAX_SCALE_STEPS = 8 # The largest zoom or subsample used to scale an image
+
+def get_scale(scale):
+    """Returns the (zoom, subsample) pair closest to a scale, such as 0.5 or
+    "2/3" """
+    fraction = Fraction(scale).limit_denominator(MAX_SCALE_STEPS)
+    return (min(fraction.numerator, MAX_SCALE_STEPS),
+            max(fraction.denominator, 1))
+
+class ImageCache:
+    """Loads each image the first time it is needed and keeps it for every
+    later deal and game. Scaled copies are kept in a bounded cache, which
+    forgets the least recently used copy when it is full. Anything showing
+    an image must keep a reference to it, as Tk deletes images that Python
+    no longer references"""
+
+    def __init__(self, folder=CARD_FOLDER, max_scaled=MAX_SCALED_IMAGES):
+        """Creates an empty cache"""
+        self.folder = folder
+        self.max_scaled = max_scaled
+        self.images = {} # Full size images by name
+        self.scaled_images = OrderedDict() # Scaled images by (name, zoom,
+        # subsample), with the most recently used last
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def load(self, name):
+        """Returns the full size image with a file name, loading it if it is
+        not in the cache"""
+        image = self.images.get(name)
+        if image is None:
+            image = PhotoImage(file=os.path.join(self.folder, name + ".gif"))
+            self.images[name] = image
+        return image
+
+    def get(self, name, zoom=1, subsample=1):
+        """Returns the image with a file name, scaled by zoom / subsample"""
+        if zoom == 1 and subsample == 1:
+            if name in self.images:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return self.load(name)
+
+        key = (name, zoom, subsample)
+        image = self.scaled_images.get(key)
+        if image is not None:
+            self.hits += 1
+            self.scaled_images.move_to_end(key)
+            return image
+        self.misses += 1
+        image = self.load(name)
+        if zoom != 1:
+            image = image.zoom(zoom)
+        if subsample != 1:
+            image = image.subsample(subsample)
+        self.scaled_images[key] = image
+        if len(self.scaled_images) > self.max_scaled:
+            self.scaled_images.popitem(last=False)
+            self.evictions += 1
+        return image
+
+    def card(self, card_id, zoom=1, subsample=1):
+        """Returns the face of a card"""
+        return self.get(card_name(card_id), zoom, subsample)
+
+    def empty(self, zoom=1, subsample=1):
+        """Returns the marker for an empty place"""
+        return self.get(EMPTY_NAME, zoom, subsample)
+
+    def back(self, zoom=1, subsample=1):
+        """Returns the back of a card"""
+        return self.get(BACK_NAME, zoom, subsample)
+
+    def stats(self):
+        """Returns a dictionary of the cache's hits, misses and size"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups != 0 else 0.0,
+            "evictions": self.evictions,
+            "images": len(self.images),
+            "scaled_images": len(self.scaled_images)
+        }
+
+# The cache shared by every board
+IMAGES = ImageCache()
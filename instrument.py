@@ -0,0 +1,124 @@
+"""instrument.py
+Records how long each event handler takes and how many Tk calls it makes
+Created: 17.10.26
+"""
+import cProfile
+import pstats
+import sys
+import time
+from array import array
+
+HISTOGRAM_BUCKETS = 32 # Bucket i holds values from 2 ** (i - 1) up to 2 ** i
+PROFILE_LINES = 25
+
+class Histogram:
+    """Counts values in a fixed number of buckets, each twice as wide as the
+    one before, so it never grows however many values are added"""
+
+    def __init__(self):
+        """Creates an empty histogram"""
+        self.buckets = array("L", [0] * HISTOGRAM_BUCKETS)
+        self.count = 0
+        self.total = 0
+        self.largest = 0
+
+    def add(self, value):
+        """Adds a whole number that is 0 or more"""
+        self.buckets[min(value.bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += value
+        self.largest = max(self.largest, value)
+
+    def percentile(self, percent):
+        """Returns the upper bound of the bucket that holds a percentile"""
+        target = self.count * percent / 100
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target and count != 0:
+                return min(2 ** i, self.largest)
+        return self.largest
+
+    def mean(self):
+        """Returns the mean of the values"""
+        return self.total / self.count if self.count != 0 else 0.0
+
+class Instruments:
+    """Wraps event handlers to record the time and Tk calls of every call,
+    and can profile the next few calls of a handler"""
+
+    def __init__(self, call_counter):
+        """Creates empty records. call_counter is the object whose count
+        holds the number of Tk calls made so far"""
+        self.call_counter = call_counter
+        self.times = {} # Histograms of microseconds by handler name
+        self.calls = {} # Histograms of Tk calls by handler name
+        self.profiles = {} # The (profiler, calls left) of profiled handlers
+
+    def install(self, cls, name):
+        """Replaces a method of a class with one that records each call to it
+        as "Class.method". Widgets created afterwards use the new method"""
+        function = getattr(cls, name)
+        label = "%s.%s" % (cls.__name__, name)
+        self.times[label] = Histogram()
+        self.calls[label] = Histogram()
+
+        def handler(*args, **kwargs):
+            return self.call(label, function, args, kwargs)
+        handler.__name__ = function.__name__
+        handler.__doc__ = function.__doc__
+        setattr(cls, name, handler)
+
+    def profile_next(self, label, count):
+        """Profiles the next count calls of a handler, printing the profile
+        after the last one. Raises ValueError if the handler is not
+        instrumented, as it would never be profiled"""
+        if label not in self.times:
+            raise ValueError("%s is not instrumented. Handlers that can be "
+                             "profiled: %s" % (label,
+                                               ", ".join(sorted(self.times))))
+        self.profiles[label] = (cProfile.Profile(), count)
+
+    def call(self, label, function, args, kwargs):
+        """Calls a handler, recording its time and Tk calls"""
+        start_calls = self.call_counter.count
+        start = time.perf_counter()
+        try:
+            if label in self.profiles:
+                return self.call_profiled(label, function, args, kwargs)
+            return function(*args, **kwargs)
+        finally:
+            self.times[label].add(int((time.perf_counter() - start) * 1e6))
+            self.calls[label].add(self.call_counter.count - start_calls)
+
+    def call_profiled(self, label, function, args, kwargs):
+        """Calls a handler under its profiler, printing the profile once it
+        has been called enough times"""
+        profiler, left = self.profiles[label]
+        try:
+            return profiler.runcall(function, *args, **kwargs)
+        finally:
+            if left > 1:
+                self.profiles[label] = (profiler, left - 1)
+            else:
+                del self.profiles[label]
+                print("Profile of %s:" % label)
+                pstats.Stats(profiler, stream=sys.stdout).sort_stats(
+                    "cumulative").print_stats(PROFILE_LINES)
+
+    def dump(self, event=None, stream=None):
+        """Prints the latency and Tk calls of every handler that was called"""
+        stream = sys.stdout if stream is None else stream
+        stream.write("%-28s %6s %9s %9s %9s %9s %7s %7s\n" %
+                     ("handler", "calls", "mean us", "p50 us", "p99 us",
+                      "max us", "tk p50", "tk max"))
+        for label, times in sorted(self.times.items()):
+            if times.count == 0:
+                continue
+            calls = self.calls[label]
+            stream.write("%-28s %6d %9.0f %9d %9d %9d %7d %7d\n" %
+                         (label, times.count, times.mean(),
+                          times.percentile(50), times.percentile(99),
+                          times.largest, calls.percentile(50),
+                          calls.largest))
+        stream.flush()
@@ -0,0 +1,164 @@
+"""movelog.py
+Records games as their deal and a compact log of moves, and replays them
+Created: 17.10.26
+
+Usage: python movelog.py LOG [--game N] [--moves N]
+
+A log file holds any number of games, appended one after another. Each game
+is a marker byte, the length of its deal seed and the seed itself, followed
+by 2 bytes for each move: the card, or a code for a flip or an undo, and the
+place it went to. Flips are replayed by the engine, so a flip that turns the
+open cards back needs nothing extra. A redo is logged as the move it makes.
+"""
+import argparse
+import mmap
+import os
+import struct
+
+from engine import (DEAL_VERSION, FLIP, NO_CARD, PLACE_DECK, PLACE_PILE,
+                    PLACE_STACK, STATE_TOP_BOARD, STATE_TOP_PILE, Game,
+                    History, get_seed)
+
+LOG_MAGIC = b"MLOG"
+LOG_VERSION = 1
+HEADER = struct.Struct("<4sHH") # Magic, log version and deal version
+GAME_MARKER = 0xFE # Starts a game. No move byte can have this value
+FLIP_CODE = 0xFF
+UNDO_CODE = 0xFD
+UNDO = None # An undo in a list of logged moves
+
+def encode_move(move):
+    """Returns the 2 bytes that log a move, or UNDO"""
+    if move is UNDO:
+        return bytes((UNDO_CODE, 0))
+    card_id, state, position = move
+    if card_id == NO_CARD:
+        return bytes((FLIP_CODE, PLACE_DECK))
+    if state == STATE_TOP_PILE:
+        return bytes((card_id, PLACE_PILE + position))
+    return bytes((card_id, PLACE_STACK + position))
+
+def decode_moves(data):
+    """Returns the list of moves logged in some bytes, with UNDO for each
+    undo"""
+    moves = []
+    for card_id, place in zip(data[0::2], data[1::2]):
+        if card_id == FLIP_CODE:
+            moves.append(FLIP)
+        elif card_id == UNDO_CODE:
+            moves.append(UNDO)
+        elif place >= PLACE_STACK:
+            moves.append((card_id, STATE_TOP_BOARD, place - PLACE_STACK))
+        else:
+            moves.append((card_id, STATE_TOP_PILE, place - PLACE_PILE))
+    return moves
+
+class MoveLog:
+    """Appends games to a log file"""
+
+    def __init__(self, path):
+        """Opens a log file for appending, creating it if needed"""
+        self.log_file = open(path, "ab")
+        if self.log_file.tell() == 0:
+            self.log_file.write(HEADER.pack(LOG_MAGIC, LOG_VERSION,
+                                            DEAL_VERSION))
+
+    def start_game(self, game):
+        """Starts logging a newly dealt game"""
+        seed = game.seed
+        if seed is None:
+            seed = get_seed(game.card_order)
+        seed_bytes = seed.to_bytes((seed.bit_length() + 7) // 8, "little")
+        self.log_file.write(bytes((GAME_MARKER, len(seed_bytes))) +
+                            seed_bytes)
+        self.log_file.flush()
+
+    def write(self, move):
+        """Logs a move"""
+        self.log_file.write(encode_move(move))
+
+    def write_undo(self):
+        """Logs an undo"""
+        self.log_file.write(encode_move(UNDO))
+
+    def flush(self):
+        """Writes the logged moves to the file"""
+        self.log_file.flush()
+
+    def close(self):
+        """Closes the file"""
+        self.log_file.close()
+
+def read_games(path):
+    """Yields the (seed, moves) of each game in a log file, in order. The
+    file is mapped rather than read, so only the game being yielded is held
+    in memory"""
+    if os.path.getsize(path) <= HEADER.size:
+        return
+    with open(path, "rb") as log_file, \
+         mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        magic, version, deal_version = HEADER.unpack_from(data)
+        if magic != LOG_MAGIC or version != LOG_VERSION:
+            raise ValueError("%s is not a version %d move log" %
+                             (path, LOG_VERSION))
+        if deal_version != DEAL_VERSION:
+            raise ValueError("%s was recorded with deal version %d" %
+                             (path, deal_version))
+        start = HEADER.size
+        while start < len(data):
+            if data[start] != GAME_MARKER:
+                raise ValueError("%s is damaged at byte %d" % (path, start))
+            seed_start = start + 2
+            moves_start = seed_start + data[start + 1]
+            seed = int.from_bytes(data[seed_start:moves_start], "little")
+            # Only a game marker can have this value at the start of a move
+            end = data.find(bytes((GAME_MARKER,)), moves_start)
+            if end == -1:
+                end = len(data)
+            yield seed, decode_moves(data[moves_start:end])
+            start = end
+
+def replay(seed, moves, count=None, history=None):
+    """Replays the first count logged moves of a game, or all of them,
+    without showing them. Returns the History of the game, which is dealt
+    from the seed unless the history of a game already dealt is given"""
+    if history is None:
+        history = History(Game(seed=seed))
+    for move in moves[:count]:
+        if move is UNDO:
+            history.undo()
+        else:
+            history.apply(move)
+    return history
+
+def main():
+    """Summarises a log, or shows one of its games, from the command line"""
+    parser = argparse.ArgumentParser(description="Replays logged games")
+    parser.add_argument("log", help="the log file")
+    parser.add_argument("--game", type=int, default=None,
+                        help="show the position of one game")
+    parser.add_argument("--moves", type=int, default=None,
+                        help="the number of moves of the game to replay")
+    args = parser.parse_args()
+    if args.game is not None:
+        for i, (seed, moves) in enumerate(read_games(args.log)):
+            if i == args.game:
+                game = replay(seed, moves, args.moves).game
+                print("Seed %d after %d of %d moves:" %
+                      (seed, len(moves[:args.moves]), len(moves)))
+                for place, cards in enumerate(game.places):
+                    print(place, cards)
+                print("Won" if game.is_won() else "Not won")
+                return
+        print("There is no game %d" % args.game)
+        return
+
+    games = moves_total = won = 0
+    for seed, moves in read_games(args.log):
+        games += 1
+        moves_total += len(moves)
+        won += replay(seed, moves).game.is_won()
+    print("%d games, %d moves, %d won" % (games, moves_total, won))
+
+if __name__ == "__main__":
+    main()
@@ -3,76 +3,66 @@ A solitaire game
 Author: Daniel Harris
 Created: 17.07.18
 """
+import sys
+import time
 from tkinter import *
-from random import shuffle
 
-WINDOW = Tk()
+from animation import FRAME_MS, Animator
+from engine import (BOARD_SIZE, DECK_SIZE, FLIP, NO_CARD, NUM_PLACES,
+                    NUM_SUITS,
+                    PLACE_DECK, PLACE_OPEN_DECK, PLACE_PILE, PLACE_STACK,
+                    STATE_BOARD, STATE_DECK, STATE_PILE, STATE_TOP_BOARD,
+                    STATE_TOP_DECK, STATE_TOP_PILE, STATE_USED_DECK,
+                    STATE_VIS_BOARD, Game, History,
+                    card_is_red, card_name, card_suit, card_value)
+from hints import HintSearch
+from images import IMAGES, get_scale
+from instrument import Instruments
+from movelog import MoveLog, read_games, replay
+from winnable import WinnableIndex
 
 BUTTON_HEIGHT = 200
 BUTTON_WIDTH = 131
 BUTTON_SMALL_HEIGHT = int(BUTTON_HEIGHT / 4)
 BUTTON_RELIEF = "flat"
+SOLVE_STEP_MS = 400 # The pause between the moves of "Solve from here"
 
-CARD_SUITS = {
-    "0": "Spades",
-    "1": "Hearts",
-    "2": "Diamonds",
-    "3": "Clubs"
-}
-RED_SUITS = (1, 2)
-NUM_SUITS = len(CARD_SUITS)
-BOARD_SIZE = NUM_SUITS + 3
-
-# Card States
-STR_DECK = "Deck" # In the hidden part of the deck
-STR_TOP_DECK = "Top Deck" # Just drawn from the deck
-STR_USED_DECK = "Used Deck" # Was drawn from the deck but was not used and
-# another card was drawn
-STR_BOARD = "Board" # Hidden card on the board
-STR_TOP_BOARD = "Top Board" # At the very bottom of its section of the board
-STR_VIS_BOARD = "Vis Board" # On the board and visible, but there are cards
-# underneath it
-STR_PILE = "Pile" # On the pile with one or more cards on top
-STR_TOP_PILE = "Top Pile" # On the top of the pile
-
-CARD_NAMES = {
-    "1": "A",
-    "2": "2",
-    "3": "3",
-    "4": "4",
-    "5": "5",
-    "6": "6",
-    "7": "7",
-    "8": "8",
-    "9": "9",
-    "10": "10",
-    "11": "J",
-    "12": "Q",
-    "13": "K"
-}
-
-DECK_SIZE = NUM_SUITS * len(CARD_NAMES)
-
-EMPTY_IMAGE = PhotoImage(file="card_folder\\empty.gif")
-BACK_IMAGE = PhotoImage(file="card_folder\\red_back.gif")
 
 class Empty:
     """An empty class for storing dummy cards"""
     
-    def __init__(self, state=STR_DECK, pos=0, height=0):
+    def __init__(self, state=STATE_DECK, pos=0, height=0):
         """Initializer"""
         self.state = state
         self.state_position = pos
         self.state_height = height
 
+class TkCallCounter:
+    """Counts the calls made to Tk, so the cost of each move can be seen"""
+    
+    def __init__(self):
+        """Creates a counter"""
+        self.count = 0
+    
+    def add(self, calls=1):
+        """Records some calls to Tk"""
+        self.count += calls
+
+TK_CALLS = TkCallCounter()
+
 class DualButton:
-    """Creates a pseudo-button that can be disabled"""
+    """Creates a pseudo-button that can be disabled. Only the widget in use
+    is ever on the grid, and calls that would not change anything are not
+    sent to Tk"""
     
     STR_COMMAND = "command"
     
     def __init__(self, parent, disable_button=False, **kwargs):
         """Initialises both a button and a label"""
         self.button_off = disable_button
+        self.gridded = False
+        self.grid_options = {}
+        self.options = dict(kwargs)
         self.button = Button(parent, **kwargs)
         if DualButton.STR_COMMAND in kwargs.keys():
             del kwargs[DualButton.STR_COMMAND]
@@ -80,41 +70,49 @@ class DualButton:
     
     def disable_button(self):
         """Disables the button"""
-        self.button_off = True
-        if len(self.button.grid_info()) != 0:
-            self.button.grid_forget()
-            self.label.grid(**self.grid_options)
+        if self.button_off is False:
+            self.button_off = True
+            if self.gridded:
+                self.button.grid_forget()
+                self.label.grid(**self.grid_options)
+                TK_CALLS.add(2)
     
     def enable_button(self):
         """Enables the button"""
-        self.button_off = False
-        if len(self.label.grid_info()) != 0:
-            self.label.grid_forget()
-            self.button.grid(**self.grid_options)
+        if self.button_off is True:
+            self.button_off = False
+            if self.gridded:
+                self.label.grid_forget()
+                self.button.grid(**self.grid_options)
+                TK_CALLS.add(2)
     
     def grid(self, **options):
         """Adds the widget to a grid"""
+        if self.gridded and options == self.grid_options:
+            return
         if self.button_off is True:
             self.label.grid(**options)
         else:
             self.button.grid(**options)
+        TK_CALLS.add()
+        self.gridded = True
         self.grid_options = options
     
     def grid_forget(self):
         """Removes the widget from the grid"""
-        self.button.grid_forget()
-        self.label.grid_forget()
+        if self.gridded:
+            if self.button_off is True:
+                self.label.grid_forget()
+            else:
+                self.button.grid_forget()
+            TK_CALLS.add()
+            self.gridded = False
     
     def grid_configure(self, **options):
         """Configures the positioning of the widget"""
-        if self.button_off is True:
-            self.label.grid_forget()
-            self.label.grid(**options)
-            self.grid_options = self.label.grid_info()
-        else:
-            self.button.grid_forget()
-            self.button.grid(**options)
-            self.grid_options = self.button.grid_info()            
+        new_options = dict(self.grid_options)
+        new_options.update(options)
+        self.grid(**new_options)
         
     def config(self, **kwargs):
         """Configures the options of the label and button. Same as configure"""
@@ -122,59 +120,43 @@ class DualButton:
         
     def configure(self, **kwargs):
         """Configures the options of the label and button"""
-        self.button.configure(**kwargs)
-        if DualButton.STR_COMMAND in kwargs.keys():
-            del kwargs[DualButton.STR_COMMAND]
-        self.label.configure(**kwargs)
+        changed = {}
+        for key, value in kwargs.items():
+            if key not in self.options or self.options[key] != value:
+                changed[key] = value
+        if len(changed) == 0:
+            return
+        self.options.update(changed)
+        self.button.configure(**changed)
+        TK_CALLS.add()
+        if DualButton.STR_COMMAND in changed.keys():
+            del changed[DualButton.STR_COMMAND]
+        if len(changed) != 0:
+            self.label.configure(**changed)
+            TK_CALLS.add()
 
-class CardContainer:
-    """A class that holds Cards"""
-    
-    def __init__(self):
-        """Creates a card containter"""
-        self.cards = []
-    
-    def __str__(self):
-        """Returns a string representation of the container"""
-        return_string = ""
-        for card in self.cards:
-            return_string += str(card) + ", "
-        return return_string
-    
-    def pop(self, pos=-1):
-        """Removes and returns a card, defaulting to the last one"""
-        return self.cards.pop(pos)
-    
-    def peek(self, pos=-1, remove=False):
-        """Returns a card, defaulting to the last one"""
-        return self.cards[pos]
-    
-    def __len__(self):
-        """Returns the number of cards in the container"""
-        return len(self.cards)
-    
-    def append(self, other):
-        """A method to add a card to the container"""
-        self.cards.append(other)
 
 class Card:
     """A Card class"""
     
+    __slots__ = ("card_id", "suit", "value", "is_red", "state",
+                 "state_position", "state_height", "board", "image", "button")
+    
     def __init__(self, card_id, board):
         """Creates a card"""
         self.card_id = card_id
-        self.suit = CARD_SUITS[str(card_id % NUM_SUITS)]
-        self.value = (card_id // NUM_SUITS) + 1
-        self.is_red = True if card_id % NUM_SUITS in RED_SUITS else False
-        self.state = STR_DECK # The area the card is placed on the board
+        self.suit = card_suit(card_id)
+        self.value = card_value(card_id)
+        self.is_red = card_is_red(card_id)
+        self.state = STATE_DECK # The area the card is placed on the board
         self.state_position = 0 # The horizontal position of the card
         self.state_height = 0 # The number of cards below this one
         self.board = board
-        self.image = PhotoImage(file="card_folder\\" + CARD_NAMES[str(self.value)] + self.suit[0] + ".gif")
+        self.image = None # The face is loaded the first time it is shown
         self.button = DualButton(board.window, 
                                  height=BUTTON_HEIGHT, 
                                  width=BUTTON_WIDTH, 
-                                 image=self.image, 
+                                 image=IMAGES.back(), 
                                  relief="flat", anchor=N, 
                                  command=self.send_move, 
                                  highlightthickness=0, 
@@ -186,7 +168,7 @@ class Card:
     
     def __str__(self):
         """Returns a string representation of the card"""
-        return CARD_NAMES[str(self.value)] + self.suit[0]
+        return card_name(self.card_id)
     
     def get_position(self):
         """Returns a tuple containing the state, position and height of the card"""
@@ -198,26 +180,36 @@ class Card:
         position = self.state_position = self.state_position if position is None else position
         height = self.state_height = self.state_height if height is None else height
         
-        self.button.grid_forget()
-        
         # If the card is visible
-        if state not in [STR_PILE, STR_USED_DECK, STR_DECK]:
+        if state not in [STATE_PILE, STATE_USED_DECK, STATE_DECK]:
             host_frame = self.board.get_card_place(state, position)
-            self.button.enable_button()
-            self.button.config(image=self.image)
-            if state == STR_BOARD:
-                self.button.disable_button()
-                self.button.config(image=BACK_IMAGE, height=BUTTON_SMALL_HEIGHT)
-            elif state == STR_TOP_PILE:
+            row = height if state in [STATE_BOARD, STATE_VIS_BOARD, STATE_TOP_BOARD] else 0
+            grid_options = {"in_": host_frame, "row": row, "column": 0}
+            
+            # Gridding a card again moves it, even to another frame, so it
+            # is not removed from the grid first
+            if state in [STATE_BOARD, STATE_TOP_PILE]:
                 self.button.disable_button()
-                self.button.config(height=BUTTON_HEIGHT)
-            elif state == STR_VIS_BOARD:
-                self.button.config(height=BUTTON_SMALL_HEIGHT)
+                self.board.enabled_cards.discard(self)
             else:
-                self.button.config(height=BUTTON_HEIGHT)
-                
-            row = height if state in [STR_BOARD, STR_VIS_BOARD, STR_TOP_BOARD] else 0
-            self.button.grid(in_=host_frame, row=row, column=0)
+                self.button.enable_button()
+                self.board.enabled_cards.add(self)
+            if state == STATE_BOARD:
+                self.button.config(image=IMAGES.back(), height=BUTTON_SMALL_HEIGHT)
+            elif state == STATE_VIS_BOARD:
+                self.button.config(image=self.get_image(), height=BUTTON_SMALL_HEIGHT)
+            else:
+                self.button.config(image=self.get_image(), height=BUTTON_HEIGHT)
+            self.button.grid(**grid_options)
+        else:
+            self.button.grid_forget()
+            self.board.enabled_cards.discard(self)
+    
+    def get_image(self):
+        """Returns the face of the card, loading it if it has not been shown"""
+        if self.image is None:
+            self.image = IMAGES.card(self.card_id)
+        return self.image
     
     def move_here(self):
         """Tells the board to move a moving card here"""
@@ -225,21 +217,236 @@ class Card:
 
 
 
-class Board:
-    """A Board class"""
+class BoardController:
+    """The parts of a board that do not depend on how it is drawn: the game
+    and its history, drawing changes once Tk is idle, undo and redo,
+    auto-play, hints and dealing new games. Each board draws the game with
+    update_cards, cancels a selection with restore_commands and draws a
+    hint with show_move and clear_hint"""
+    
+    def __init__(self, window, winnable=None, log=None):
+        """Sets up a board, which only deals winnable deals if it is given a
+        WinnableIndex and records its games if it is given a MoveLog"""
+        self.window = window
+        self.winnable = winnable
+        self.log = log
+        self.moving_card = None
+        self.update_id = None # The idle callback that draws the changes
+        self.report_tk_calls = False
+        self.count_start = None # The Tk call count when the move started
+        self.last_tk_calls = 0 # The number of Tk calls in the last move
+        self.hints = HintSearch(window, self.show_hint)
+        self.hints_on = False
+        self.solving = False # Whether hinted moves are made automatically
+        self.hint_move = None
+        self.play_id = None # The timer that makes the hinted move
+        self.auto_play_on = False
+    
+    def deal(self, seed=None):
+        """Deals the cards, shuffled unless a deal seed is given, reusing the
+        cards of any game before"""
+        if seed is None and self.winnable is not None:
+            seed = self.winnable.random_seed()
+        self.game = Game(seed=seed)
+        self.history = History(self.game, self.log)
+        if self.log is not None:
+            self.log.start_game(self.game)
+        self.update_cards(self.game.take_dirty_places())
+    
+    def schedule_update(self):
+        """Draws the changes to the game once Tk is idle, so that
+        several changes are shown together"""
+        if self.update_id is None:
+            self.update_id = self.window.after_idle(self.idle_flush)
+    
+    def idle_flush(self):
+        """Draws the changes once Tk is idle. This is the only flush that is
+        instrumented, so that each update is timed once"""
+        self.update_id = None
+        self.draw_changes()
+    
+    def flush(self):
+        """Draws the changes made since the last update straight away,
+        instead of once Tk is idle"""
+        if self.update_id is None:
+            return
+        self.window.after_cancel(self.update_id)
+        self.update_id = None
+        self.draw_changes()
+    
+    def draw_changes(self):
+        """Draws the changes made since the last update"""
+        places = self.game.take_dirty_places()
+        self.update_cards(places)
+        self.restore_commands()
+        self.stop_counting()
+        self.update_hint(len(places) != 0)
+    
+    def start_counting(self):
+        """Starts counting the Tk calls of a move"""
+        if self.count_start is None:
+            self.count_start = TK_CALLS.count
+    
+    def stop_counting(self):
+        """Records the number of Tk calls made by the last move"""
+        if self.count_start is not None:
+            self.last_tk_calls = TK_CALLS.count - self.count_start
+            self.count_start = None
+            if self.report_tk_calls:
+                print("Tk calls in move:", self.last_tk_calls)
+    
+    def undo(self, event=None):
+        """Undoes the last move"""
+        self.step_history(self.history.undo)
+    
+    def redo(self, event=None):
+        """Makes the last undone move again"""
+        self.step_history(self.history.redo)
+    
+    def step_history(self, step):
+        """Cancels any move that was started, then undoes or redoes a move"""
+        self.flush()
+        self.solving = False
+        if self.moving_card is not None:
+            self.restore_commands()
+        self.start_counting()
+        step()
+        self.schedule_update()
+    
+    def fast_forward(self, moves):
+        """Makes some logged moves, only drawing the position after the
+        last one"""
+        replay(self.game.seed, moves, history=self.history)
+        self.schedule_update()
+    
+    def new_game(self, event=None):
+        """Deals a new game in the same window"""
+        self.flush()
+        self.solving = False
+        self.moving_card = None
+        self.restore_commands()
+        self.start_counting()
+        self.deal()
+        self.stop_counting()
+        self.update_hint(True)
+    
+    def toggle_auto_play(self, event=None):
+        """Turns auto-play on or off"""
+        self.flush()
+        self.auto_play_on = not self.auto_play_on
+        self.start_counting()
+        self.auto_play()
+        self.schedule_update()
+    
+    def auto_play(self):
+        """Makes every move to the piles that can never lose, and finishes
+        the game once no card is hidden. The moves are only drawn at the
+        next update, all together"""
+        if not self.auto_play_on:
+            return
+        move = self.game.auto_move()
+        while move is not None:
+            self.history.apply(move)
+            move = self.game.auto_move()
+    
+    def toggle_hints(self, event=None):
+        """Turns hints on or off. While they are on, the next move is
+        searched for in the background after every move"""
+        self.hints_on = not self.hints_on
+        self.solving = False
+        self.update_hint(True)
+    
+    def solve_from_here(self, event=None):
+        """Makes each hinted move in turn until the game is won"""
+        self.hints_on = True
+        self.solving = True
+        self.update_hint(True)
+    
+    def update_hint(self, moved):
+        """Starts a new search if the position has changed, or shows the
+        last hint again if it has not"""
+        if not self.hints_on:
+            self.hints.cancel()
+            self.hint_move = None
+            self.clear_hint()
+            self.window.title("Solitaire")
+        elif moved:
+            self.hint_move = None
+            self.clear_hint()
+            self.window.title("Solitaire - searching for a hint")
+            self.hints.start(self.game)
+        elif self.hint_move is not None and self.moving_card is None:
+            self.show_move(self.hint_move)
+            # Solving carries on once a selection that held it up ends
+            if self.solving:
+                self.schedule_play_hint()
+    
+    def show_hint(self, result):
+        """Shows the first move of a finished search"""
+        if len(result.moves) == 0:
+            self.solving = False
+            self.window.title("Solitaire - %s" % result.status)
+            return
+        self.hint_move = result.moves[0]
+        self.window.title("Solitaire - %d moves to win" % len(result.moves))
+        # A hint that arrives while a card is selected is shown once the
+        # selection ends, so that the selection is left alone
+        if self.moving_card is None:
+            self.show_move(self.hint_move)
+        if self.solving:
+            self.schedule_play_hint()
+    
+    def schedule_play_hint(self):
+        """Makes the hinted move after a pause, unless it is already
+        waiting to be made"""
+        if self.play_id is None:
+            self.play_id = self.window.after(SOLVE_STEP_MS, self.play_hint)
+    
+    def play_hint(self):
+        """Makes the hinted move while solving"""
+        self.play_id = None
+        if self.solving and self.hint_move is not None and \
+           self.moving_card is None and self.game.is_legal(self.hint_move):
+            self.start_counting()
+            self.history.apply(self.hint_move)
+            self.auto_play()
+            self.schedule_update()
+    
+    def flip_deck(self):
+        """Draws a card from the deck, or turns the open cards back over"""
+        if self.game.can_flip():
+            self.solving = False
+            self.start_counting()
+            self.history.apply(FLIP)
+            self.auto_play()
+            self.schedule_update()
+
+
+
+class Board(BoardController):
+    """A Board class, which shows a game from the engine"""
     
-    SYSTEM_BG = "SystemButtonFace"
     CANCEL_BG = "red"
     VALID_BG = "green"
     
-    def __init__(self, window):
-        """Creates a Board"""
-        self.window = window
+    def __init__(self, window, seed=None, winnable=None, log=None):
+        """Creates a Board, which only deals winnable deals if it is given a
+        WinnableIndex and records its games if it is given a MoveLog"""
+        super().__init__(window, winnable, log)
         window.columnconfigure(NUM_SUITS, weight=1)
-        
+        # The normal colour of a button is different on each platform
+        probe = Button(window)
+        self.system_bg = probe.cget("background")
+        probe.destroy()
+    
         self.card_dict = {}
-        self.moving_card = None
-        
+        self.card_list = [] # The cards indexed by their card id
+        self.enabled_cards = set() # Shown cards that can be clicked
+        self.selected_cards = [] # Cards changed by prepare_move
+        self.selected_empty_buttons = [] # Empty markers changed by
+        # prepare_move
+        self.hint_buttons = [] # Widgets outlined by the hint
+    
         # Creates each pile
         self.piles_frame = Frame(window)
         self.piles_frame.grid(row=0, column=0, columnspan=NUM_SUITS)
@@ -247,7 +454,7 @@ class Board:
         for i in range(0, NUM_SUITS):
             self.pile_list.append(Pile(self, i))
             self.pile_list[-1].pile_frame.grid(row=0, column=i)
-        
+    
         # Creates each stack
         self.stacks_frame = Frame(window)
         self.stacks_frame.grid(row=1, column=0, columnspan=BOARD_SIZE)
@@ -255,193 +462,149 @@ class Board:
         for i in range(0, BOARD_SIZE):
             self.stack_list.append(Stack(self, i))
             self.stack_list[-1].stack_frame.grid(row=0, column=i, sticky=N)
-            max_height = BOARD_SIZE + len(CARD_NAMES) # Max number of hidden 
-            # cards plus the biggest possible stack of cards
-        
-        # Deals the cards
-        self.deck = Deck(self)
-        self.deal()
     
-    def deal(self):
-        """Deals the cards"""
-        card_list = []
+        # Creates the cards once, to be dealt again for each new game
+        self.deck = Deck(self)
         for card_id in range(DECK_SIZE):
             new_card = Card(card_id, self)
-            card_list.append(new_card)
-            self.card_dict[CARD_NAMES[str(new_card.value)] + new_card.suit[0]] = new_card
-        
-        # Shuffles the cards and moves them to the deck
-        shuffle(card_list)
-        for i, card in enumerate(card_list):
-            self.deck.closed_deck_cards.append(card)
-            card.state_height=i
-        
-        for stack in self.stack_list:
-            stack.empty_button.grid_forget()
-        
-        # Removes cards from the deck and places them on the board
-        for i in range(BOARD_SIZE):
-            card = self.deck.closed_deck_cards.pop()
-            card.move(STR_TOP_BOARD, i, i)
-            self.get_card_list(STR_TOP_BOARD, i).append(card)
-            for j in range(i+1, BOARD_SIZE):
-                card = self.deck.closed_deck_cards.pop()
-                card.move(STR_BOARD, j, i)
-                self.get_card_list(STR_BOARD, j).append(card)                
-                
+            self.card_list.append(new_card)
+            self.card_dict[str(new_card)] = new_card
+        self.deal(seed)
+        window.bind("<Control-z>", self.undo)
+        window.bind("<Control-y>", self.redo)
+        window.bind("<KeyPress-h>", self.toggle_hints)
+        window.bind("<KeyPress-s>", self.solve_from_here)
+        window.bind("<KeyPress-a>", self.toggle_auto_play)
+        window.bind("<Control-n>", self.new_game)
+        window.bind("<F2>", self.new_game)
+    
     def get_card_place(self, state, position):
         """Returns the frame for the card to place its button"""
-        if state == STR_TOP_PILE:
+        if state == STATE_TOP_PILE:
             return self.pile_list[position].pile_frame
-        elif state == STR_TOP_DECK:
-            return self.deck.open_frame     
+        elif state == STATE_TOP_DECK:
+            return self.deck.open_frame
         else:
             return self.stack_list[position].stack_frame
     
-    def get_card_list(self, state, position):
-        """Returns the list for the card to place its reference"""
-        if state == STR_TOP_PILE or state == STR_PILE:
-            return self.pile_list[position].pile_cards
-        elif state == STR_TOP_DECK or state == STR_USED_DECK:
-            return self.deck.open_deck_cards
-        elif state == STR_DECK:
-            return self.deck.closed_deck_cards        
-        else:
-            return self.stack_list[position].stack_cards
+    def update_cards(self, places):
+        """Moves the card widgets in the given places to match the state of
+        the game"""
+        for place in places:
+            for height, card_id in enumerate(self.game.places[place]):
+                position = self.game.get_place_position(place, height)
+                card = self.card_list[card_id]
+                if card.get_position() != position:
+                    card.move(*position)
+    
+            # Shows the empty markers of anything without cards
+            empty = len(self.game.places[place]) == 0
+            if place >= PLACE_STACK:
+                self.stack_list[place - PLACE_STACK].show_empty(empty)
+            elif place >= PLACE_PILE:
+                self.pile_list[place - PLACE_PILE].show_empty(empty)
+    
+        if PLACE_DECK in places or PLACE_OPEN_DECK in places:
+            self.deck.show_cards(len(self.game.closed_deck_cards),
+                                 len(self.game.open_deck_cards))
     
     def restore_commands(self):
         """Restores the normal commands of the cards after a card is moved"""
+        self.clear_hint()
         self.deck.closed_deck_button.enable_button()
-        
-        for pile in self.pile_list:
-            pile.empty_button.config(bg=Board.SYSTEM_BG)
-            pile.empty_button.disable_button()
-            
-        for stack in self.stack_list:
-            stack.empty_button.config(bg=Board.SYSTEM_BG)
-            stack.empty_button.disable_button()
-            
-        for card in self.card_dict.values():
-            if card.state in [STR_TOP_DECK, STR_TOP_BOARD, STR_VIS_BOARD]:
+    
+        for empty_button in self.selected_empty_buttons:
+            empty_button.config(bg=self.system_bg)
+            empty_button.disable_button()
+    
+        for card in self.selected_cards:
+            if card.state in [STATE_TOP_DECK, STATE_TOP_BOARD, STATE_VIS_BOARD]:
                 card.button.enable_button()
-                card.button.config(command=card.send_move, bg=Board.SYSTEM_BG)
+                card.button.config(command=card.send_move, bg=self.system_bg)
             else:
                 card.button.disable_button()
-                card.button.config(command=card.send_move, bg=Board.SYSTEM_BG)
+                card.button.config(command=card.send_move, bg=self.system_bg)
+        self.selected_cards = []
+        self.selected_empty_buttons = []
+        self.moving_card = None
     
     def prepare_move(self, moving_card):
         """Prepares a card to be moved, changing the command of all possible
         targets"""
+        self.flush()
+        self.clear_hint()
+        self.solving = False
+        self.start_counting()
         self.moving_card = moving_card
         moving_card.button.config(command=moving_card.move_here, bg=Board.CANCEL_BG)
-        for card in self.card_dict.values():
-            # Allows some cards in the top of the pile to have cards moved to it
-            if card.state == STR_TOP_PILE and card.value + 1 == \
-               moving_card.value and card.suit == moving_card.suit and \
-               moving_card.state != STR_VIS_BOARD:
-                card.button.enable_button()
-                card.button.config(command=card.move_here, bg=Board.VALID_BG)
-            # Allows some cards on the board to have cards moved to it
-            elif card.state == STR_TOP_BOARD and card.value == \
-                 moving_card.value + 1 and card.is_red != moving_card.is_red \
-                 and card.get_position()[:2] != moving_card.get_position()[:2]:
+        # Allows the user to cancel the move by selecting the same button,
+        # and disables every other card that can be clicked
+        self.selected_cards = [moving_card]
+        for card in self.enabled_cards:
+            if card != moving_card:
+                card.button.disable_button()
+                self.selected_cards.append(card)
+    
+        self.deck.closed_deck_button.disable_button()
+    
+        # Allows the card to be moved to each valid target
+        for state, position in self.game.card_moves(moving_card.card_id):
+            target_cards = self.game.get_card_list(state, position)
+            if len(target_cards) != 0:
+                card = self.card_list[target_cards.peek()]
                 card.button.enable_button()
                 card.button.config(command=card.move_here, bg=Board.VALID_BG)
-            # Allows the user to cancel the move by selecting the same button
-            elif card == moving_card:
-                card.button.enable_button()
+                self.selected_cards.append(card)
+            # Aces can be moved to empty piles and Kings to empty stacks
             else:
-                card.button.disable_button()
-        
-        self.deck.closed_deck_button.disable_button()
-        
-        # Allows Aces to be moved to empty piles
-        for pile in self.pile_list:
-            if len(pile.pile_cards) == 0 and moving_card.state != STR_VIS_BOARD\
-               and moving_card.value == 1:
-                pile.empty_button.enable_button()
-                pile.empty_button.config(bg=Board.VALID_BG)
-        
-        # Allows Kings to be moved to empty stacks
-        for stack in self.stack_list:
-            if len(stack.stack_cards) == 0 and \
-               moving_card.value == len(CARD_NAMES):
-                stack.empty_button.enable_button()
-                stack.empty_button.config(bg=Board.VALID_BG)
+                if state == STATE_TOP_PILE:
+                    empty_button = self.pile_list[position].empty_button
+                else:
+                    empty_button = self.stack_list[position].empty_button
+                empty_button.enable_button()
+                empty_button.config(bg=Board.VALID_BG)
+                self.selected_empty_buttons.append(empty_button)
     
     def move_card(self, target):
         """Moves a moving card to a target card"""
-        
+    
         # If the target card is not the same as the moving card
         if target != self.moving_card:
-            
-            # This sets the desired new state of the moving card
-            if self.moving_card.state != STR_VIS_BOARD:
-                state = target.state
+            move = (self.moving_card.card_id, target.state,
+                    target.state_position)
+            if self.game.is_legal(move):
+                self.history.apply(move)
+                self.auto_play()
+        self.moving_card = None
+        self.schedule_update()
+    
+    def show_move(self, move):
+        """Outlines the card and the target of a move, or the deck if the
+        move is a flip"""
+        self.clear_hint()
+        card_id, state, position = move
+        if card_id == NO_CARD:
+            self.hint_buttons = [self.deck.closed_deck_button]
+        else:
+            self.hint_buttons = [self.card_list[card_id].button]
+            target_cards = self.game.get_card_list(state, position)
+            if len(target_cards) != 0:
+                target = self.card_list[target_cards.peek()].button
+            elif state == STATE_TOP_PILE:
+                target = self.pile_list[position].empty_button
             else:
-                state = STR_VIS_BOARD
-            position = target.state_position
-            height = target.state_height + 1
-            
-            # If the target is not on the pile
-            if type(target) == Card:
-                if target.state == STR_TOP_BOARD:
-                    target.state = STR_VIS_BOARD
-                    target.button.config(height=BUTTON_SMALL_HEIGHT)
-                elif target.state == STR_TOP_PILE:
-                    target.state = STR_PILE
-                    target.button.grid_forget()
-    
-            prev_pos = self.moving_card.get_position()
-            # If the desired state implies that only one card will move
-            if state in [STR_TOP_PILE, STR_TOP_BOARD]:
-                self.get_card_list(state, position).append(self.moving_card)
-                self.moving_card.move(state, position, height)
-                self.get_card_list(*prev_pos[:2]).pop()
-                
-                # Shows the next card of the deck if the moving card was there
-                if prev_pos[0] == STR_TOP_DECK:
-                    if prev_pos[2] > 0:
-                        self.deck.open_deck_cards.peek().move(state=STR_TOP_DECK)
-                    else:
-                        self.deck.open_deck_label.grid()
-                # Otherwise the card must be on the board, so show the next
-                # card in that position
-                else:
-                    prev_stack = self.stack_list[prev_pos[1]]
-                    if len(prev_stack.stack_cards) == 0:
-                        prev_stack.empty_button.disable_button()
-                        prev_stack.empty_button.grid()
-                    else:
-                        self.get_card_list(*prev_pos[:2]).peek().move(
-                            STR_TOP_BOARD)
-            # Otherwise, there must be multiple cards moving, so move all cards
-            # in the pile
-            elif state == STR_VIS_BOARD:
-                vis_target = Empty(state, position, height)
-                self.move_recursive(self.get_card_list(*prev_pos[:2]), 
-                                    prev_pos[2], vis_target)
-                prev_stack = self.stack_list[prev_pos[1]]
-                if len(prev_stack.stack_cards) == 0:
-                    prev_stack.empty_button.disable_button()
-                    prev_stack.empty_button.grid()
-                else:
-                    self.get_card_list(*prev_pos[:2]).peek().move(STR_TOP_BOARD)                
-                
-        self.restore_commands()
-        
-    def move_recursive(self, home_list, index, target):
-        """Recursively moves a stack of cards from a home list to a target"""
-        if len(home_list) > index:
-            if len(home_list) == index + 1:
-                target.state = STR_TOP_BOARD            
-            self.get_card_list(target.state, target.state_position).append(home_list.peek(index))
-            home_list.peek(index).move(target.state, target.state_position, target.state_height)
-            target.state_height += 1
-            self.move_recursive(home_list, index+1, target)
-            home_list.pop()
-            
-            
+                target = self.stack_list[position].empty_button
+            self.hint_buttons.append(target)
+        for button in self.hint_buttons:
+            button.config(bg=Board.VALID_BG)
+    
+    def clear_hint(self):
+        """Removes the outline of the hinted move"""
+        for button in self.hint_buttons:
+            button.config(bg=self.system_bg)
+        self.hint_buttons = []
+
+
 
 class Pile:
     """A class that operates an ordered pile of cards"""
@@ -451,20 +614,25 @@ class Pile:
         self.board = board
         self.pileid = pileid
         self.pile_frame = Frame(self.board.piles_frame)
-        self.pile_cards = CardContainer()
         self.empty_button = DualButton(self.pile_frame,
                                        True,
-                                       image=EMPTY_IMAGE,
+                                       image=IMAGES.empty(),
                                        relief=BUTTON_RELIEF,
                                        command=self.move_here,
                                        highlightthickness=0,
                                        borderwidth=0)
         self.empty_button.grid()
     
+    def show_empty(self, empty):
+        """Shows or hides the empty pile marker"""
+        if empty:
+            self.empty_button.grid(row=0, column=0)
+        else:
+            self.empty_button.grid_forget()
+    
     def move_here(self):
         """Moves a card to this empty pile"""
-        self.empty_button.grid_forget()
-        target = Empty(STR_TOP_PILE, self.pileid, -1)
+        target = Empty(STATE_TOP_PILE, self.pileid, -1)
         self.board.move_card(target)
 
 class Stack:
@@ -475,20 +643,25 @@ class Stack:
         self.board = board
         self.stackid = stackid
         self.stack_frame = Frame(self.board.stacks_frame)
-        self.stack_cards = CardContainer()
         self.empty_button = DualButton(self.stack_frame,
                                        True,
-                                       image=EMPTY_IMAGE,
+                                       image=IMAGES.empty(),
                                        relief=BUTTON_RELIEF,
                                        command=self.move_here,
                                        highlightthickness=0,
                                        borderwidth=0)
         self.empty_button.grid(row=0, column=0)
     
+    def show_empty(self, empty):
+        """Shows or hides the empty stack marker"""
+        if empty:
+            self.empty_button.grid(row=0, column=0)
+        else:
+            self.empty_button.grid_forget()
+    
     def move_here(self):
         """Moves a card to this empty stack"""
-        self.empty_button.grid_forget()
-        target = Empty(STR_TOP_BOARD, self.stackid, -1)
+        target = Empty(STATE_TOP_BOARD, self.stackid, -1)
         self.board.move_card(target)
     
 class Deck:
@@ -496,11 +669,11 @@ class Deck:
     
     def __init__(self, board):
         """Creates the deck operator"""
+        self.board = board
         self.closed_frame = Frame(board.window)
         self.closed_frame.grid(row=0, column=BOARD_SIZE - 2)
-        self.closed_deck_cards = CardContainer()
         self.closed_deck_button = DualButton(self.closed_frame, 
-                                         image=BACK_IMAGE,
+                                         image=IMAGES.back(),
                                          relief=BUTTON_RELIEF,
                                          command=self.flip, 
                                          highlightthickness=0, 
@@ -509,43 +682,462 @@ class Deck:
         
         self.open_frame = Frame(board.window)
         self.open_frame.grid(row=0, column=BOARD_SIZE - 1)
-        self.open_deck_cards = CardContainer()
         self.open_deck_label = Label(self.open_frame, 
-                                     image=EMPTY_IMAGE, 
+                                     image=IMAGES.empty(), 
                                      highlightthickness=0, 
                                      borderwidth=0)  
         self.open_deck_label.grid()
+        self.open_label_shown = True
+    
+    def show_cards(self, closed_count, open_count):
+        """Shows the back of the deck if it has cards, and the empty marker if
+        no cards have been drawn"""
+        image = IMAGES.back() if closed_count != 0 else IMAGES.empty()
+        self.closed_deck_button.config(image=image)
+        if (open_count == 0) != self.open_label_shown:
+            self.open_label_shown = open_count == 0
+            if self.open_label_shown:
+                self.open_deck_label.grid()
+            else:
+                self.open_deck_label.grid_forget()
+            TK_CALLS.add()
     
     def flip(self):
         """Moves a card from the deck to the top of the deck if possible.
         Otherwise this refreshes the deck"""
-        # Flips a card if there are cards in the deck
-        if len(self.closed_deck_cards) != 0:
-            card = self.closed_deck_cards.pop()
-            if len(self.open_deck_cards) != 0: 
-                # Hides the last visible card of the deck
-                self.open_deck_cards.peek().move(state=STR_USED_DECK)
+        self.board.flip_deck()
+
+class CanvasBoard(BoardController):
+    """A board that draws the whole table on one canvas, with an image item
+    for each card instead of a pair of widgets"""
+    
+    CARD_TAG = "card"
+    CARD_ID_TAG = "card%d" # Tags each card item, so that a run of cards can
+    # be moved with one tag expression
+    SLOT_TAG = "slot"
+    CANCEL_BG = "red"
+    VALID_BG = "green"
+    HIGHLIGHT_WIDTH = 3
+    HIDDEN_STATES = [STATE_PILE, STATE_USED_DECK, STATE_DECK]
+    MOVABLE_STATES = [STATE_TOP_DECK, STATE_TOP_BOARD, STATE_VIS_BOARD]
+    
+    def __init__(self, window, scale=1, seed=None, winnable=None, log=None):
+        """Creates a board on a new canvas, with the cards scaled by a
+        fraction of their full size. Only winnable deals are dealt if it is
+        given a WinnableIndex, and games are recorded if it is given a
+        MoveLog"""
+        super().__init__(window, winnable, log)
+        self.zoom, self.subsample = get_scale(scale)
+        self.card_width = BUTTON_WIDTH * self.zoom // self.subsample
+        self.card_height = BUTTON_HEIGHT * self.zoom // self.subsample
+        self.small_height = BUTTON_SMALL_HEIGHT * self.zoom // self.subsample
+        self.back_image = IMAGES.back(self.zoom, self.subsample)
+        self.empty_image = IMAGES.empty(self.zoom, self.subsample)
+        self.canvas = Canvas(window,
+                             width=BOARD_SIZE * self.card_width,
+                             height=2 * self.card_height,
+                             highlightthickness=0,
+                             borderwidth=0)
+        self.canvas.grid(row=0, column=0)
+        self.canvas_height = 2 * self.card_height
+    
+        self.targets = [] # The (state, position) targets of the moving card
+        self.highlights = [] # Rectangles that outline the selection
+        self.highlights_used = 0
+        self.hint_outlines = [] # Rectangles that outline the hint
+        self.hint_outlines_used = 0
+        self.animator = None # Slides moved cards if set, instead of jumping
+    
+        # Creates a marker under each place, which shows when it is empty
+        self.slot_items = []
+        self.item_places = {}
+        for place in range(NUM_PLACES):
+            image = self.back_image if place == PLACE_DECK else self.empty_image
+            x, y = self.get_place_coords(place)
+            item = self.canvas.create_image(x, y, image=image, anchor=NW,
+                                            tags=CanvasBoard.SLOT_TAG)
+            self.slot_items.append(item)
+            self.item_places[item] = place
+        self.canvas.tag_bind(CanvasBoard.SLOT_TAG, "<Button-1>",
+                             self.click_slot)
+        self.canvas.tag_bind(CanvasBoard.CARD_TAG, "<Button-1>",
+                             self.click_card)
+        window.bind("<Control-z>", self.undo)
+        window.bind("<Control-y>", self.redo)
+        window.bind("<KeyPress-h>", self.toggle_hints)
+        window.bind("<KeyPress-s>", self.solve_from_here)
+        window.bind("<KeyPress-a>", self.toggle_auto_play)
+        window.bind("<Control-n>", self.new_game)
+        window.bind("<F2>", self.new_game)
+    
+        # Creates an item for each card once, to be dealt again for each new
+        # game
+        self.card_images = [None] * DECK_SIZE # Faces are loaded when shown
+        self.card_items = []
+        self.item_cards = {}
+        self.item_coords = [None] * DECK_SIZE
+        self.item_images = [None] * DECK_SIZE
+        self.item_shown = [False] * DECK_SIZE
+        for card_id in range(DECK_SIZE):
+            item = self.canvas.create_image(0, 0, image=self.back_image,
+                                            anchor=NW, state=HIDDEN,
+                                            tags=(CanvasBoard.CARD_TAG,
+                                                  CanvasBoard.CARD_ID_TAG %
+                                                  card_id))
+            self.card_items.append(item)
+            self.item_cards[item] = card_id
+        self.deal(seed)
+    
+    def deal(self, seed=None):
+        """Deals the cards, checking every card against its item, although
+        items that are already right are left alone"""
+        self.card_positions = [None] * DECK_SIZE
+        super().deal(seed)
+    
+    def get_place_coords(self, place, height=0):
+        """Returns the canvas coordinates of a card at a height in a place"""
+        if place == PLACE_DECK:
+            return ((BOARD_SIZE - 2) * self.card_width, 0)
+        elif place == PLACE_OPEN_DECK:
+            return ((BOARD_SIZE - 1) * self.card_width, 0)
+        elif place < PLACE_STACK:
+            return ((place - PLACE_PILE) * self.card_width, 0)
+        return ((place - PLACE_STACK) * self.card_width,
+                self.card_height + height * self.small_height)
+    
+    def show_card(self, card_id, place, position):
+        """Moves a card's image item to match its position"""
+        self.card_positions[card_id] = position
+        state, position, height = position
+        item = self.card_items[card_id]
+        if state in CanvasBoard.HIDDEN_STATES:
+            if self.item_shown[card_id]:
+                self.canvas.itemconfigure(item, state=HIDDEN)
+                self.item_shown[card_id] = False
+                TK_CALLS.add()
+            return
+    
+        if state == STATE_BOARD:
+            image = self.back_image
+        else:
+            if self.card_images[card_id] is None:
+                self.card_images[card_id] = IMAGES.card(card_id, self.zoom,
+                                                        self.subsample)
+            image = self.card_images[card_id]
+        if image is not self.item_images[card_id] or \
+           not self.item_shown[card_id]:
+            self.canvas.itemconfigure(item, image=image, state=NORMAL)
+            self.item_images[card_id] = image
+            self.item_shown[card_id] = True
+            TK_CALLS.add()
+        coords = self.get_place_coords(place, height)
+        if coords != self.item_coords[card_id]:
+            self.canvas.coords(item, *coords)
+            self.item_coords[card_id] = coords
+            TK_CALLS.add()
+        self.canvas.tag_raise(item)
+        TK_CALLS.add()
+    
+    def get_shift(self, card_id, place, position):
+        """Returns the (x, y) distance a shown card has to move to reach a
+        position, or None if it has to be changed in any other way"""
+        state, position, height = position
+        if state in CanvasBoard.HIDDEN_STATES or not self.item_shown[card_id]:
+            return None
+        if state == STATE_BOARD:
+            image = self.back_image
+        else:
+            image = self.card_images[card_id]
+        if image is not self.item_images[card_id]:
+            return None
+        x, y = self.get_place_coords(place, height)
+        old_x, old_y = self.item_coords[card_id]
+        return (x - old_x, y - old_y)
+    
+    def shift_run(self, run, shift):
+        """Moves a run of shown cards by the same distance and raises them in
+        order, with one call each whatever the length of the run"""
+        if len(run) == 0:
+            return
+        tags = "||".join(CanvasBoard.CARD_ID_TAG % card_id for card_id in run)
+        if shift != (0, 0):
+            if self.animator is not None:
+                self.animator.add(tags, shift)
             else:
-                # Hides the empty card marker
-                self.open_deck_label.grid_forget()
-                
-            card.move(state=STR_TOP_DECK, height=len(self.open_deck_cards))
-            self.open_deck_cards.append(card)
-            if len(self.closed_deck_cards) == 0:
-                self.closed_deck_button.config(image=EMPTY_IMAGE)
-        # Otherwise resets the deck
+                self.canvas.move(tags, *shift)
+                TK_CALLS.add()
+        self.canvas.tag_raise(tags)
+        TK_CALLS.add()
+    
+    def update_cards(self, places):
+        """Moves the card items in the given places to match the state of the
+        game"""
+        # Cards still sliding from the last update are put in place first, as
+        # the moves below start from where the cards should be
+        if self.animator is not None:
+            self.animator.finish()
+        # Cards are raised from the bottom of each place up, so that cards
+        # that overlap are drawn in order. Cards that only move, such as a
+        # run moved between stacks, are moved together
+        for place in places:
+            run = []
+            run_shift = None
+            for height, card_id in enumerate(self.game.places[place]):
+                position = self.game.get_place_position(place, height)
+                if self.card_positions[card_id] == position:
+                    continue
+                shift = self.get_shift(card_id, place, position)
+                if shift != run_shift:
+                    self.shift_run(run, run_shift)
+                    run = []
+                    run_shift = shift
+                if shift is None:
+                    self.show_card(card_id, place, position)
+                    continue
+                run.append(card_id)
+                self.card_positions[card_id] = position
+                self.item_coords[card_id] = self.get_place_coords(place,
+                                                                  height)
+            self.shift_run(run, run_shift)
+    
+        if PLACE_DECK in places:
+            has_cards = len(self.game.closed_deck_cards) != 0
+            self.canvas.itemconfigure(self.slot_items[PLACE_DECK],
+                                      image=self.back_image if has_cards else self.empty_image)
+            TK_CALLS.add()
+    
+        # Grows or shrinks the canvas to fit the longest stack
+        longest = max(len(stack) for stack in self.game.stack_cards)
+        height = self.get_place_coords(PLACE_STACK, max(longest - 1, 0))[1] + \
+            self.card_height
+        if height != self.canvas_height:
+            self.canvas_height = height
+            self.canvas.configure(height=height)
+            TK_CALLS.add()
+    
+    def draw_outline(self, outlines, index, place, height, colour):
+        """Outlines a card or an empty place with the rectangle at an index
+        of a list, adding a rectangle if the list is too short"""
+        x, y = self.get_place_coords(place, height)
+        coords = (x, y, x + self.card_width - 1, y + self.card_height - 1)
+        if index == len(outlines):
+            outlines.append(self.canvas.create_rectangle(
+                *coords, width=CanvasBoard.HIGHLIGHT_WIDTH, state=HIDDEN))
+        item = outlines[index]
+        self.canvas.coords(item, *coords)
+        self.canvas.itemconfigure(item, outline=colour, state=NORMAL)
+        self.canvas.tag_raise(item)
+        TK_CALLS.add(3)
+    
+    def highlight(self, place, height, colour):
+        """Outlines a card or an empty place as part of the selection"""
+        self.draw_outline(self.highlights, self.highlights_used, place,
+                          height, colour)
+        self.highlights_used += 1
+    
+    def restore_commands(self):
+        """Removes the outlines of the last selection"""
+        for item in self.highlights[:self.highlights_used]:
+            self.canvas.itemconfigure(item, state=HIDDEN)
+            TK_CALLS.add()
+        self.highlights_used = 0
+        self.moving_card = None
+        self.targets = []
+    
+    def prepare_move(self, card_id):
+        """Selects a card to be moved, outlining all possible targets"""
+        self.restore_commands()
+        self.clear_hint()
+        self.solving = False
+        self.start_counting()
+        self.moving_card = card_id
+        self.targets = self.game.card_moves(card_id)
+        place = self.game.card_places[card_id]
+        self.highlight(place, self.card_positions[card_id][2],
+                       CanvasBoard.CANCEL_BG)
+        for state, position in self.targets:
+            if state == STATE_TOP_PILE:
+                target_place = PLACE_PILE + position
+            else:
+                target_place = PLACE_STACK + position
+            height = max(len(self.game.places[target_place]) - 1, 0)
+            self.highlight(target_place, height, CanvasBoard.VALID_BG)
+    
+    def move_card(self, state, position):
+        """Moves the moving card to a target, or cancels the move if the
+        target is not valid"""
+        if (state, position) in self.targets:
+            self.history.apply((self.moving_card, state, position))
+            self.auto_play()
+        self.schedule_update()
+    
+    def show_move(self, move):
+        """Outlines the card and the target of a move, or the deck if the
+        move is a flip"""
+        self.clear_hint()
+        card_id, state, position = move
+        if card_id == NO_CARD:
+            self.outline_hint(PLACE_DECK, 0)
+            return
+        self.outline_hint(self.game.card_places[card_id],
+                          self.card_positions[card_id][2])
+        if state == STATE_TOP_PILE:
+            target_place = PLACE_PILE + position
         else:
-            card = self.open_deck_cards.pop()
-            card.button.grid_forget()
-            self.closed_deck_cards.append(card)
-            card.move(state=STR_DECK, height=0)
-            for i in range(len(self.open_deck_cards)):
-                card = self.open_deck_cards.pop()
-                self.closed_deck_cards.append(card)
-                card.move(state=STR_DECK, height=i)
-            self.closed_deck_button.config(image=BACK_IMAGE)
-            self.open_deck_label.grid()     
+            target_place = PLACE_STACK + position
+        self.outline_hint(target_place,
+                          max(len(self.game.places[target_place]) - 1, 0))
+    
+    def outline_hint(self, place, height):
+        """Outlines a card or an empty place as part of the hint"""
+        self.draw_outline(self.hint_outlines, self.hint_outlines_used, place,
+                          height, CanvasBoard.VALID_BG)
+        self.hint_outlines_used += 1
+    
+    def clear_hint(self):
+        """Removes the outlines of the hinted move"""
+        for item in self.hint_outlines[:self.hint_outlines_used]:
+            self.canvas.itemconfigure(item, state=HIDDEN)
+            TK_CALLS.add()
+        self.hint_outlines_used = 0
+    
+    def finish_drawing(self):
+        """Draws any pending changes and puts every card that is still
+        sliding in its place, so that a click acts on the cards where they
+        end up"""
+        self.flush()
+        if self.animator is not None:
+            self.animator.finish()
+    
+    def click_card(self, event):
+        """Selects, moves or cancels a move when a card is clicked"""
+        self.finish_drawing()
+        item = self.canvas.find_withtag(CURRENT)[0]
+        card_id = self.item_cards[item]
+        state, position, height = self.card_positions[card_id]
+        if self.moving_card is None:
+            if state in CanvasBoard.MOVABLE_STATES:
+                self.prepare_move(card_id)
+        elif card_id == self.moving_card:
+            self.schedule_update()
+        elif state in [STATE_TOP_PILE, STATE_TOP_BOARD]:
+            self.move_card(state, position)
+    
+    def click_slot(self, event):
+        """Flips the deck, or moves to an empty pile or stack, when the marker
+        under a place is clicked"""
+        self.finish_drawing()
+        item = self.canvas.find_withtag(CURRENT)[0]
+        place = self.item_places[item]
+        if place == PLACE_DECK:
+            if self.moving_card is None:
+                self.flip_deck()
+        elif self.moving_card is not None:
+            if place >= PLACE_STACK:
+                self.move_card(STATE_TOP_BOARD, place - PLACE_STACK)
+            elif place >= PLACE_PILE:
+                self.move_card(STATE_TOP_PILE, place - PLACE_PILE)
+
+def get_option(name, default=None):
+    """Returns the value of a command line option such as --scale=1/2"""
+    for arg in sys.argv[1:]:
+        if arg.startswith(name + "="):
+            return arg[len(name) + 1:]
+    return default
+
+def get_handlers():
+    """Returns the (class, method name) of every event handler that can be
+    instrumented. Each board's idle_flush is included, as that is where a
+    move is drawn"""
+    return [(Card, "send_move"), (Card, "move_here"), (Pile, "move_here"),
+            (Stack, "move_here"), (Deck, "flip"), (Board, "idle_flush"),
+            (Board, "undo"), (Board, "redo"), (Board, "new_game"),
+            (CanvasBoard, "click_card"), (CanvasBoard, "click_slot"),
+            (CanvasBoard, "idle_flush"), (CanvasBoard, "undo"),
+            (CanvasBoard, "redo"), (CanvasBoard, "new_game")]
+
+def install_instruments(profile=None):
+    """Instruments every event handler, and profiles the next calls of one
+    if profile is given as "Class.method:calls". Returns the Instruments.
+    Raises ValueError if profile is not an instrumented handler and a
+    number of calls"""
+    instruments = Instruments(TK_CALLS)
+    for cls, name in get_handlers():
+        instruments.install(cls, name)
+    if profile is not None:
+        label, colon, count = profile.rpartition(":")
+        if colon == "" or not count.isdigit():
+            raise ValueError('--profile takes "Class.method:calls", not %s' %
+                             profile)
+        instruments.profile_next(label, int(count))
+    return instruments
+
+def report_first_frame(window, start_time):
+    """Prints the time from start_time until the window has been drawn for
+    the first time, then closes the window"""
+    window.unbind("<Expose>")
+    # Tk draws when it is idle, so this runs after the first drawing
+    window.after_idle(print_first_frame, window, start_time)
+
+def print_first_frame(window, start_time):
+    """Prints the time to the first frame and closes the window"""
+    print("First frame: %.1f ms" % ((time.perf_counter() - start_time) * 1000))
+    window.destroy()
+
+def main(start_time=None):
+    """Opens the game window and returns once it is closed. The time to the
+    first frame is measured from start_time, or from now if it is None"""
+    if start_time is None:
+        start_time = time.perf_counter()
+    # The handlers are replaced before any widget takes them as a command
+    instruments = None
+    if "--instrument" in sys.argv or get_option("--profile") is not None:
+        try:
+            instruments = install_instruments(get_option("--profile"))
+        except ValueError as error:
+            sys.exit(error)
+    window = Tk()
+    window.title("Solitaire")
+    if instruments is not None:
+        window.bind("<F12>", instruments.dump)
+    seed = get_option("--seed")
+    seed = int(seed) if seed is not None else None
+    winnable = get_option("--winnable")
+    winnable = WinnableIndex(winnable) if winnable is not None else None
+    log = get_option("--log")
+    log = MoveLog(log) if log is not None else None
+    # Continues the last game in a log, from the end or from a move number
+    replay_moves = []
+    if get_option("--replay") is not None:
+        for seed, replay_moves in read_games(get_option("--replay")):
+            pass
+        replay_moves = replay_moves[:int(get_option("--move",
+                                                    len(replay_moves)))]
+    # The canvas board can be chosen instead of the grid of widgets
+    if "--canvas" in sys.argv:
+        board = CanvasBoard(window, get_option("--scale", 1), seed, winnable,
+                            log)
+        if "--animate" in sys.argv:
+            board.animator = Animator(window, board.canvas,
+                                      int(get_option("--frame-ms",
+                                                     FRAME_MS)))
+    else:
+        board = Board(window, seed, winnable, log)
+    board.fast_forward(replay_moves)
+    if "--auto-play" in sys.argv:
+        board.toggle_auto_play()
+    board.report_tk_calls = "--tk-calls" in sys.argv
+    if "--startup-times" in sys.argv:
+        window.bind("<Expose>",
+                    lambda event: report_first_frame(window, start_time))
+    window.mainloop()
+    board.hints.cancel()
+    if log is not None:
+        log.close()
+    if "--image-stats" in sys.argv:
+        print("Image cache:", IMAGES.stats())
+    if instruments is not None:
+        instruments.dump()
 
-board = Board(WINDOW)
 if __name__ == "__main__":
-    WINDOW.mainloop()
\ No newline at end of file
+    main()
@@ -0,0 +1,267 @@
+"""solver.py
+Finds out whether a game of solitaire can be won
+Created: 17.10.26
+"""
+import sys
+import time
+from collections import OrderedDict
+from random import Random
+
+from engine import (BOARD_SIZE, CARD_NAMES, DECK_SIZE, NO_CARD, NUM_PLACES,
+                    PLACE_DECK, PLACE_OPEN_DECK, PLACE_PILE, PLACE_STACK,
+                    STATE_TOP_DECK, STATE_TOP_PILE, Game, card_suit,
+                    card_value)
+
+# Results of a search
+SOLVED = "solved"
+UNSOLVABLE = "unsolvable"
+BUDGET_EXCEEDED = "budget exceeded"
+CANCELLED = "cancelled"
+
+MAX_NODES = 1000000
+MAX_SECONDS = 60.0
+MAX_TABLE_SIZE = 2000000 # Positions remembered by the transposition table
+TIME_CHECK_NODES = 1024 # The clock is only read this often
+STOP_CHECK_NODES = 64 # A search is stopped within this many nodes
+ZOBRIST_SEED = 1807
+
+# Move priorities, lowest first
+PRIORITY_PILE = 0
+PRIORITY_REVEAL = 1
+PRIORITY_DECK = 2
+PRIORITY_BOARD = 3
+PRIORITY_FLIP = 4
+PRIORITY_SPLIT = 5 # Splitting a run without freeing a card for the piles
+
+class ZobristHasher:
+    """Hashes positions by combining a random key for each card in each
+    place and height, so a move only changes the keys of the cards it
+    moves. Piles are hashed by their cards only, as it does not matter
+    which pile holds a suit"""
+
+    def __init__(self, seed=ZOBRIST_SEED):
+        """Creates the random keys"""
+        rng = Random(seed)
+        self.card_keys = [rng.getrandbits(64)
+                          for i in range(DECK_SIZE * NUM_PLACES * DECK_SIZE)]
+        self.hidden_keys = [rng.getrandbits(64)
+                            for i in range(BOARD_SIZE * DECK_SIZE)]
+
+    def card_key(self, card_id, place, height):
+        """Returns the key of a card at a height in a place"""
+        if PLACE_PILE <= place < PLACE_STACK:
+            place, height = PLACE_PILE, 0
+        return self.card_keys[(card_id * NUM_PLACES + place) * DECK_SIZE +
+                              height]
+
+    def hidden_key(self, position, hidden):
+        """Returns the key of a stack with some hidden cards"""
+        return self.hidden_keys[position * DECK_SIZE + hidden]
+
+    def hash(self, game):
+        """Returns the hash of a whole position"""
+        value = 0
+        for place, cards in enumerate(game.places):
+            for height, card_id in enumerate(cards):
+                value ^= self.card_key(card_id, place, height)
+        for position, hidden in enumerate(game.hidden_counts):
+            value ^= self.hidden_key(position, hidden)
+        return value
+
+    def update(self, value, game, record):
+        """Returns the hash of a position after the move in a record, given
+        the hash before it"""
+        move, details = record
+        card_id, state, position = move
+        if card_id == NO_CARD:
+            deck = game.closed_deck_cards
+            open_deck = game.open_deck_cards
+            if details > 0:
+                height = len(open_deck) - 1
+                card_id = open_deck.peek()
+                return value ^ self.card_key(card_id, PLACE_DECK, len(deck)) ^ \
+                    self.card_key(card_id, PLACE_OPEN_DECK, height)
+            for height, card_id in enumerate(deck):
+                value ^= self.card_key(card_id, PLACE_OPEN_DECK,
+                                       len(deck) - 1 - height) ^ \
+                    self.card_key(card_id, PLACE_DECK, height)
+            return value
+
+        prev_state, prev_position, prev_height, count, revealed = details
+        if prev_state == STATE_TOP_DECK:
+            prev_place = PLACE_OPEN_DECK
+        else:
+            prev_place = PLACE_STACK + prev_position
+        if state == STATE_TOP_PILE:
+            place = PLACE_PILE + position
+        else:
+            place = PLACE_STACK + position
+        cards = game.places[place]
+        start = len(cards) - count
+        for i in range(count):
+            moved_id = cards.peek(start + i)
+            value ^= self.card_key(moved_id, prev_place, prev_height + i) ^ \
+                self.card_key(moved_id, place, start + i)
+        if revealed:
+            hidden = game.hidden_counts[prev_position]
+            value ^= self.hidden_key(prev_position, hidden + 1) ^ \
+                self.hidden_key(prev_position, hidden)
+        return value
+
+class SolveResult:
+    """The result of a search"""
+
+    def __init__(self, status, moves, nodes, seconds):
+        """Creates a result"""
+        self.status = status
+        self.moves = moves # The winning moves, if the game was solved
+        self.nodes = nodes
+        self.seconds = seconds
+
+    def __str__(self):
+        """Returns a summary of the result"""
+        return "%s in %d moves, %d nodes, %.2fs, %.0f nodes/s" % (
+            self.status, len(self.moves), self.nodes, self.seconds,
+            self.nodes_per_second())
+
+    def nodes_per_second(self):
+        """Returns the speed of the search"""
+        return self.nodes / self.seconds if self.seconds > 0 else 0.0
+
+class Solver:
+    """A depth first search for a winning list of moves"""
+
+    def __init__(self, max_nodes=MAX_NODES, max_seconds=MAX_SECONDS,
+                 max_table_size=MAX_TABLE_SIZE):
+        """Creates a solver with a budget for each search"""
+        self.max_nodes = max_nodes
+        self.max_seconds = max_seconds
+        self.max_table_size = max_table_size
+        self.hasher = ZobristHasher()
+        self.table = OrderedDict() # Hashes of positions that were searched
+        # without finding a win, oldest first
+
+    def clear(self):
+        """Forgets the positions searched before"""
+        self.table = OrderedDict()
+
+    def remember(self, value):
+        """Adds a position to the transposition table, forgetting the oldest
+        position if the table is full"""
+        if len(self.table) >= self.max_table_size:
+            self.table.popitem(last=False)
+        self.table[value] = True
+
+    def ordered_moves(self, game):
+        """Returns the legal moves in the order they should be tried. A move
+        to the piles that can never lose is returned on its own. The only
+        moves left out move a King between empty stacks, which leads to the
+        same position with two stacks swapped, so the search still finds
+        every win"""
+        moves = []
+        for move in game.legal_moves():
+            card_id, state, position = move
+            if card_id == NO_CARD:
+                priority = PRIORITY_FLIP
+            elif state == STATE_TOP_PILE:
+                if game.is_safe_to_pile(card_id):
+                    return [move]
+                priority = PRIORITY_PILE
+            else:
+                place = game.card_places[card_id]
+                if place == PLACE_OPEN_DECK:
+                    priority = PRIORITY_DECK
+                else:
+                    stack_position = place - PLACE_STACK
+                    height = game.stack_cards[stack_position].index(card_id)
+                    hidden = game.hidden_counts[stack_position]
+                    if height == hidden and hidden != 0:
+                        priority = PRIORITY_REVEAL
+                    elif height == 0:
+                        if card_value(card_id) == len(CARD_NAMES):
+                            continue # Moving a King between empty stacks
+                        priority = PRIORITY_BOARD
+                    else:
+                        # Splitting a run is rarely useful unless the card
+                        # it uncovers can then go to a pile, but it can let
+                        # the uncovered card take the other card of the same
+                        # colour, so it is tried last rather than never
+                        under_id = game.stack_cards[stack_position].peek(
+                            height - 1)
+                        if game.pile_value(card_suit(under_id)) + 1 == \
+                           card_value(under_id):
+                            priority = PRIORITY_BOARD
+                        else:
+                            priority = PRIORITY_SPLIT
+            moves.append((priority, move))
+        moves.sort(key=lambda item: item[0])
+        return [move for priority, move in moves]
+
+    def solve(self, game, keep_table=False, stop=None):
+        """Searches for a way to win a game, without changing it. Returns a
+        SolveResult. The positions that failed in the last search are only
+        kept if keep_table is True, which is only right if the last search
+        ended UNSOLVABLE in the same deal. Any other search can leave
+        positions that only failed because the way to a win went through
+        its own path. The search is cancelled once the
+        threading.Event stop is set, if one is given"""
+        if not keep_table:
+            self.clear()
+        game = game.copy()
+        start_time = time.perf_counter()
+        nodes = 0
+        value = self.hasher.hash(game)
+        path_hashes = {value} # Positions on the current path
+        path = [] # The moves of the current path
+        records = [] # The undo records of the current path
+        frames = [(iter(self.ordered_moves(game)), value)]
+
+        while len(frames) != 0:
+            if game.is_won():
+                return SolveResult(SOLVED, path,
+                                   nodes, time.perf_counter() - start_time)
+            moves, value = frames[-1]
+            move = next(moves, None)
+
+            # Goes back up when every move from a position has been tried
+            if move is None:
+                frames.pop()
+                path_hashes.discard(value)
+                self.remember(value)
+                if len(records) != 0:
+                    game.undo(records.pop())
+                    path.pop()
+                continue
+
+            record = game.apply(move)
+            new_value = self.hasher.update(value, game, record)
+            if new_value in path_hashes or new_value in self.table:
+                game.undo(record)
+                continue
+
+            nodes += 1
+            if stop is not None and nodes % STOP_CHECK_NODES == 0 and \
+               stop.is_set():
+                return SolveResult(CANCELLED, [], nodes,
+                                   time.perf_counter() - start_time)
+            if nodes >= self.max_nodes or (
+                    nodes % TIME_CHECK_NODES == 0 and
+                    time.perf_counter() - start_time >= self.max_seconds):
+                return SolveResult(BUDGET_EXCEEDED, [], nodes,
+                                   time.perf_counter() - start_time)
+            path_hashes.add(new_value)
+            path.append(move)
+            records.append(record)
+            frames.append((iter(self.ordered_moves(game)), new_value))
+
+        return SolveResult(UNSOLVABLE, [], nodes,
+                           time.perf_counter() - start_time)
+
+def solve(game, max_nodes=MAX_NODES, max_seconds=MAX_SECONDS):
+    """Searches for a way to win a game. Returns a SolveResult"""
+    return Solver(max_nodes, max_seconds).solve(game)
+
+if __name__ == "__main__":
+    # Solves a shuffled deal, or the number of deals given
+    for i in range(int(sys.argv[1]) if len(sys.argv) > 1 else 1):
+        print(solve(Game()))
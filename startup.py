@@ -0,0 +1,70 @@
+"""startup.py
+Measures how long solitaire.py takes to import and to draw its first frame
+Created: 17.10.26
+
+Usage: python startup.py [--runs N] [--canvas]
+
+Each run starts a fresh interpreter. The import is measured without a
+display, which also checks that importing the game creates no window. The
+first frame needs a display, such as one from Xvfb.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+FOLDER = os.path.dirname(os.path.abspath(__file__))
+IMPORT_CODE = ("import time; start = time.perf_counter(); import solitaire; "
+               "print('Import: %.1f ms' % "
+               "((time.perf_counter() - start) * 1000))")
+FIRST_FRAME_CODE = ("import time; start = time.perf_counter(); "
+                    "import solitaire; solitaire.main(start)")
+DEFAULT_RUNS = 5
+
+def run_code(code, args=(), env=None):
+    """Runs some code in a fresh interpreter and returns the number of
+    milliseconds it prints, or None if it fails"""
+    process = subprocess.run([sys.executable, "-c", code] + list(args),
+                             cwd=FOLDER, env=env, capture_output=True,
+                             text=True)
+    if process.returncode != 0:
+        print(process.stderr.strip().splitlines()[-1])
+        return None
+    words = process.stdout.split()
+    if len(words) < 2 or words[-1] != "ms":
+        print("No time was printed")
+        return None
+    return float(words[-2])
+
+def median(values):
+    """Returns the middle value of a list"""
+    values = sorted(values)
+    return values[len(values) // 2]
+
+def measure(name, code, runs, args=(), env=None):
+    """Prints the fastest and median time of some runs of some code"""
+    times = []
+    for i in range(runs):
+        milliseconds = run_code(code, args, env)
+        if milliseconds is None:
+            print("%s: failed" % name)
+            return
+        times.append(milliseconds)
+    print("%s: %.1f ms fastest, %.1f ms median of %d runs" %
+          (name, min(times), median(times), runs))
+
+def main():
+    """Measures the startup of the game from the command line"""
+    parser = argparse.ArgumentParser(description="Measures startup times")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS)
+    parser.add_argument("--canvas", action="store_true",
+                        help="measure the canvas board")
+    args = parser.parse_args()
+    headless = dict(os.environ)
+    headless.pop("DISPLAY", None)
+    measure("Import", IMPORT_CODE, args.runs, env=headless)
+    board_args = ["--startup-times"] + (["--canvas"] if args.canvas else [])
+    measure("First frame", FIRST_FRAME_CODE, args.runs, board_args)
+
+if __name__ == "__main__":
+    main()
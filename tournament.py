@@ -0,0 +1,324 @@
+"""tournament.py
+Plays the same seeded deals with several playing policies on every core
+Created: 17.10.26
+
+Usage: python tournament.py play START END [--policy NAME...] [--output FILE]
+                                           [--workers N]
+       python tournament.py summary FILE
+
+Games are played through Game.legal_moves and Game.apply, the same rules
+the board uses when a card is selected, moved or the deck is flipped. A game
+ends once it is won, when every move would return to a position it has
+already been in, or after MAX_MOVES moves.
+
+Results are appended to a columnar file in blocks. Each block is the number
+of rows it holds, followed by every value of the first column, then every
+value of the next, and so on. A summary reads one block at a time and skips
+the columns it does not use, so it never holds every row.
+"""
+import argparse
+import mmap
+import os
+import random
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from batch import map_chunks, seed_argument
+from engine import (DEAL_VERSION, FLIP, NO_CARD, PLACE_OPEN_DECK,
+                    PLACE_STACK, STATE_TOP_PILE, Game)
+from solver import SOLVED, Solver
+
+TOURNAMENT_MAGIC = b"TOUR"
+TOURNAMENT_VERSION = 1
+HEADER = struct.Struct("<4sHH") # Magic, file version and deal version
+BLOCK_HEADER = struct.Struct("<I") # The number of rows in a block
+COLUMNS = (("seed", "Q"), ("policy", "B"), ("won", "B"), ("moves", "H"),
+           ("passes", "H"), ("foundation", "B"), ("micros", "I"))
+COLUMN_NAMES = tuple(name for name, code in COLUMNS)
+MAX_MOVES = 1000
+MAX_RECORD_MICROS = 0xFFFFFFFF
+DEFAULT_OUTPUT = "tournament.bin"
+CHUNK_SIZE = 32 # Games sent to a worker at once, and written as one block
+SOLVER_NODES = 50000 # The budget of the solver policy for each deal
+SOLVER_SECONDS = 5.0
+
+# Kinds of move, which the greedy policies rank
+KIND_PILE = 0
+KIND_REVEAL = 1
+KIND_DECK = 2
+KIND_BOARD = 3
+KIND_FLIP = 4
+
+def move_kind(game, move):
+    """Returns the kind of a legal move"""
+    card_id, state, position = move
+    if card_id == NO_CARD:
+        return KIND_FLIP
+    if state == STATE_TOP_PILE:
+        return KIND_PILE
+    place = game.card_places[card_id]
+    if place == PLACE_OPEN_DECK:
+        return KIND_DECK
+    stack_position = place - PLACE_STACK
+    hidden = game.hidden_counts[stack_position]
+    if hidden != 0 and game.stack_cards[stack_position].index(card_id) == \
+       hidden:
+        return KIND_REVEAL
+    return KIND_BOARD
+
+class Policy:
+    """Chooses the moves of a game, at random unless a subclass chooses
+    better. To add a policy, subclass this and add it to the end of
+    POLICIES, as results refer to policies by index"""
+
+    NAME = None
+
+    def start_game(self, game, rng):
+        """Prepares to play a newly dealt game"""
+        self.rng = rng
+
+    def choose(self, game, moves):
+        """Returns one of a list of legal moves, at random"""
+        return self.rng.choice(moves)
+
+class RandomPolicy(Policy):
+    """Makes any move"""
+
+    NAME = "random"
+
+class RankedPolicy(Policy):
+    """Makes a move of the best kind, picking at random between moves of
+    the same kind"""
+
+    RANKS = None # The rank of each kind of move, lowest first. Moves
+    # between stacks that reveal nothing rank below flipping the deck
+
+    def choose(self, game, moves):
+        """Returns a random move of the best kind"""
+        ranks = [self.RANKS[move_kind(game, move)] for move in moves]
+        best = min(ranks)
+        return self.rng.choice([move for move, rank in zip(moves, ranks)
+                                if rank == best])
+
+class GreedyPolicy(RankedPolicy):
+    """Moves cards to the piles whenever it can"""
+
+    NAME = "greedy"
+    RANKS = (0, 1, 2, 4, 3)
+
+class RevealPolicy(RankedPolicy):
+    """Turns over hidden cards whenever it can"""
+
+    NAME = "reveal"
+    RANKS = (1, 0, 2, 4, 3)
+
+class SolverPolicy(GreedyPolicy):
+    """Plays the solver's solution to the deal, or plays greedily if it runs
+    out of budget or the solution is left"""
+
+    NAME = "solver"
+
+    def __init__(self):
+        """Creates the solver used for every deal"""
+        self.solver = Solver(SOLVER_NODES, SOLVER_SECONDS)
+        self.plan = []
+
+    def start_game(self, game, rng):
+        """Searches for a solution to the deal"""
+        super().start_game(game, rng)
+        result = self.solver.solve(game)
+        self.plan = result.moves[::-1] if result.status == SOLVED else []
+
+    def choose(self, game, moves):
+        """Returns the next move of the solution"""
+        if len(self.plan) != 0 and self.plan[-1] in moves:
+            return self.plan.pop()
+        self.plan = []
+        return super().choose(game, moves)
+
+POLICIES = (RandomPolicy, GreedyPolicy, RevealPolicy, SolverPolicy) # Indexed
+# by policy code
+POLICY_NAMES = tuple(policy.NAME for policy in POLICIES)
+
+def new_moves(game, seen):
+    """Returns the legal moves that lead to a position not in seen"""
+    moves = []
+    for move in game.legal_moves():
+        record = game.apply(move)
+        if game.pack() not in seen:
+            moves.append(move)
+        game.undo(record)
+    return moves
+
+def play_game(seed, policy):
+    """Plays a deal with a policy. Returns whether it was won, the number of
+    moves, the number of times the deck was turned back over and the number
+    of cards on the piles"""
+    game = Game(seed=seed)
+    policy.start_game(game, random.Random(seed))
+    seen = {game.pack()}
+    moves = passes = 0
+    while not game.is_won() and moves < MAX_MOVES:
+        choices = new_moves(game, seen)
+        if len(choices) == 0:
+            break
+        move = policy.choose(game, choices)
+        if move == FLIP and len(game.closed_deck_cards) == 0:
+            passes += 1
+        game.apply(move)
+        seen.add(game.pack())
+        moves += 1
+    foundation = sum(len(pile) for pile in game.pile_cards)
+    return game.is_won(), moves, passes, foundation
+
+policies = None # The policies of each worker process
+
+def start_worker():
+    """Creates the policies of a worker process"""
+    global policies
+    policies = [policy() for policy in POLICIES]
+
+def play_games(games):
+    """Plays some (seed, policy code) games in a worker. Returns a list of
+    rows, with a value for each column"""
+    rows = []
+    for seed, code in games:
+        start = time.perf_counter()
+        won, moves, passes, foundation = play_game(seed, policies[code])
+        micros = int((time.perf_counter() - start) * 1e6)
+        rows.append((seed, code, won, moves, passes, foundation,
+                     min(micros, MAX_RECORD_MICROS)))
+    return rows
+
+def write_block(results_file, rows):
+    """Appends some rows as one block, a column at a time"""
+    data = [BLOCK_HEADER.pack(len(rows))]
+    for (name, code), column in zip(COLUMNS, zip(*rows)):
+        data.append(struct.pack("<%d%s" % (len(rows), code), *column))
+    results_file.write(b"".join(data))
+
+def read_blocks(path, names=COLUMN_NAMES):
+    """Yields a dictionary of the values of some columns for each block of
+    a results file, ignoring a block that was only partly written. Only
+    those columns are read"""
+    if os.path.getsize(path) <= HEADER.size:
+        return
+    with open(path, "rb") as results_file, \
+         mmap.mmap(results_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        magic, version, deal_version = HEADER.unpack_from(data)
+        if magic != TOURNAMENT_MAGIC or version != TOURNAMENT_VERSION:
+            raise ValueError("%s is not a version %d tournament file" %
+                             (path, TOURNAMENT_VERSION))
+        if deal_version != DEAL_VERSION:
+            raise ValueError("%s was played with deal version %d" %
+                             (path, deal_version))
+        start = HEADER.size
+        while start + BLOCK_HEADER.size <= len(data):
+            rows, = BLOCK_HEADER.unpack_from(data, start)
+            offset = start + BLOCK_HEADER.size
+            block = {}
+            for name, code in COLUMNS:
+                column = struct.Struct("<%d%s" % (rows, code))
+                if offset + column.size > len(data):
+                    return
+                if name in names:
+                    block[name] = column.unpack_from(data, offset)
+                offset += column.size
+            yield block
+            start = offset
+
+def open_results(path):
+    """Opens a results file for appending and returns it with the set of
+    (seed, policy code) games it already holds. A partly written last block
+    is removed"""
+    done = set()
+    if os.path.exists(path) and os.path.getsize(path) >= HEADER.size:
+        end = HEADER.size
+        for block in read_blocks(path, ("seed", "policy")):
+            done.update(zip(block["seed"], block["policy"]))
+            end += BLOCK_HEADER.size + sum(
+                struct.calcsize("<%d%s" % (len(block["seed"]), code))
+                for name, code in COLUMNS)
+        results_file = open(path, "r+b")
+        results_file.truncate(end)
+        results_file.seek(0, os.SEEK_END)
+    else:
+        results_file = open(path, "wb")
+        results_file.write(HEADER.pack(TOURNAMENT_MAGIC, TOURNAMENT_VERSION,
+                                       DEAL_VERSION))
+    return results_file, done
+
+def run(start, end, policy_names, path, workers=None):
+    """Plays the seeds from start up to end with each policy, skipping the
+    games already in the results file and appending a block as each chunk
+    of games arrives"""
+    results_file, done = open_results(path)
+    codes = [POLICY_NAMES.index(name) for name in policy_names]
+    games = ((seed, code) for seed in range(start, end) for code in codes
+             if (seed, code) not in done)
+    played = 0
+    start_time = time.perf_counter()
+    with results_file, ProcessPoolExecutor(workers,
+                                           initializer=start_worker) as pool:
+        for rows in map_chunks(pool, play_games, games, CHUNK_SIZE, workers):
+            write_block(results_file, rows)
+            played += len(rows)
+            # Everything written so far survives an interrupted run
+            results_file.flush()
+    seconds = time.perf_counter() - start_time
+    print("Played %d games in %.1fs (%.1f games/s), %d already done" %
+          (played, seconds, played / seconds if seconds else 0.0,
+           len(done)))
+
+def summarise(path):
+    """Returns a dictionary of each policy's name to its number of games,
+    wins, moves, cards on the piles and microseconds of play, adding up one
+    block at a time"""
+    totals = {}
+    for block in read_blocks(path, ("policy", "won", "moves", "foundation",
+                                    "micros")):
+        for row in zip(block["policy"], block["won"], block["moves"],
+                       block["foundation"], block["micros"]):
+            total = totals.setdefault(POLICY_NAMES[row[0]], [0] * 5)
+            total[0] += 1
+            for i in range(1, 5):
+                total[i] += row[i]
+    return totals
+
+def print_summary(path):
+    """Prints the win rate, averages and speed of each policy"""
+    print("%-8s %8s %8s %8s %8s %10s" % ("policy", "games", "win %",
+                                         "moves", "piled", "games/s"))
+    for name, (games, won, moves, foundation, micros) in \
+            sorted(summarise(path).items()):
+        print("%-8s %8d %8.2f %8.1f %8.1f %10.1f" %
+              (name, games, 100 * won / games, moves / games,
+               foundation / games, games * 1e6 / micros if micros else 0.0))
+    print("games/s is for one core")
+
+def main():
+    """Plays a tournament or summarises its results from the command line"""
+    parser = argparse.ArgumentParser(description="Compares playing policies")
+    commands = parser.add_subparsers(dest="command", required=True)
+    play = commands.add_parser("play", help="play a range of deals")
+    play.add_argument("start", type=seed_argument, help="the first seed")
+    play.add_argument("end", type=seed_argument,
+                      help="the seed after the last")
+    play.add_argument("--policy", action="append", choices=POLICY_NAMES,
+                      help="a policy to play, every policy by default")
+    play.add_argument("--output", default=DEFAULT_OUTPUT)
+    play.add_argument("--workers", type=int, default=None,
+                      help="worker processes, one per core by default")
+    summary = commands.add_parser("summary", help="summarise a results file")
+    summary.add_argument("results", help="the results file")
+    args = parser.parse_args()
+    if args.command == "play":
+        run(args.start, args.end, args.policy or POLICY_NAMES, args.output,
+            args.workers)
+        print_summary(args.output)
+    else:
+        print_summary(args.results)
+
+if __name__ == "__main__":
+    main()
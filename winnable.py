@@ -0,0 +1,117 @@
+"""winnable.py
+A memory mapped index of the deals that are known to be winnable
+Created: 17.10.26
+
+Usage: python winnable.py build INDEX RESULTS...
+       python winnable.py check INDEX SEED
+       python winnable.py random INDEX
+
+The index is a header, a bitmap with a bit for each seed in its range, and
+the sorted list of winnable seeds. Looking up a seed reads one byte of the
+bitmap and picking a random winnable deal reads one entry of the list, so
+neither loads the whole file.
+"""
+import mmap
+import random
+import struct
+import sys
+
+from engine import DEAL_VERSION
+from solver import SOLVED
+
+INDEX_MAGIC = b"WINI"
+INDEX_VERSION = 1
+HEADER = struct.Struct("<4sHHQQQ") # Magic, index version, deal version,
+# first seed, number of seeds and number of winnable seeds
+ENTRY = struct.Struct("<Q")
+DEFAULT_INDEX = "winnable.idx"
+
+def build_index(path, results_paths):
+    """Writes an index of the solved seeds in some batch results files.
+    Returns the number of winnable seeds"""
+    # Imported here, as batch loads the process pool, which the game does not
+    # need when it only reads an index
+    from batch import read_results
+    seeds = set()
+    winnable = set()
+    for results_path in results_paths:
+        for seed, outcome, moves, nodes in read_results(results_path):
+            seeds.add(seed)
+            if outcome == SOLVED:
+                winnable.add(seed)
+    first = min(seeds) if len(seeds) != 0 else 0
+    count = max(seeds) + 1 - first if len(seeds) != 0 else 0
+
+    bitmap = bytearray((count + 7) // 8)
+    for seed in winnable:
+        offset = seed - first
+        bitmap[offset // 8] |= 1 << (offset % 8)
+    with open(path, "wb") as index_file:
+        index_file.write(HEADER.pack(INDEX_MAGIC, INDEX_VERSION, DEAL_VERSION,
+                                     first, count, len(winnable)))
+        index_file.write(bitmap)
+        for seed in sorted(winnable):
+            index_file.write(ENTRY.pack(seed))
+    return len(winnable)
+
+class WinnableIndex:
+    """Reads an index of winnable deals without loading it into memory"""
+
+    def __init__(self, path=DEFAULT_INDEX):
+        """Maps an index file into memory"""
+        with open(path, "rb") as index_file:
+            self.data = mmap.mmap(index_file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        magic, version, deal_version, self.first, self.count, \
+            self.winnable_count = HEADER.unpack_from(self.data)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            raise ValueError("%s is not a version %d winnable index" %
+                             (path, INDEX_VERSION))
+        if deal_version != DEAL_VERSION:
+            raise ValueError("%s was built for deal version %d and needs to "
+                             "be rebuilt" % (path, deal_version))
+        self.entries_start = HEADER.size + (self.count + 7) // 8
+
+    def __len__(self):
+        """Returns the number of winnable deals"""
+        return self.winnable_count
+
+    def __contains__(self, seed):
+        """Returns whether a seed is known to be winnable"""
+        offset = seed - self.first
+        if offset < 0 or offset >= self.count:
+            return False
+        return self.data[HEADER.size + offset // 8] >> (offset % 8) & 1 == 1
+
+    def get(self, i):
+        """Returns the seed of the ith winnable deal"""
+        if i < 0 or i >= self.winnable_count:
+            raise IndexError("winnable deal out of range")
+        return ENTRY.unpack_from(self.data,
+                                 self.entries_start + i * ENTRY.size)[0]
+
+    def random_seed(self, rng=random):
+        """Returns the seed of a random winnable deal"""
+        if self.winnable_count == 0:
+            raise ValueError("the index has no winnable deals")
+        return self.get(rng.randrange(self.winnable_count))
+
+    def close(self):
+        """Unmaps the index"""
+        self.data.close()
+
+def main():
+    """Builds or reads an index from the command line"""
+    if len(sys.argv) >= 4 and sys.argv[1] == "build":
+        count = build_index(sys.argv[2], sys.argv[3:])
+        print("%d winnable deals" % count)
+    elif len(sys.argv) == 4 and sys.argv[1] == "check":
+        index = WinnableIndex(sys.argv[2])
+        print("winnable" if int(sys.argv[3]) in index else "not known")
+    elif len(sys.argv) == 3 and sys.argv[1] == "random":
+        print(WinnableIndex(sys.argv[2]).random_seed())
+    else:
+        print(__doc__)
+
+if __name__ == "__main__":
+    main()